@@ -0,0 +1,85 @@
+import asyncio
+import time
+
+USER = 0
+CHANNEL = 1
+
+HOUR = 3600
+
+
+def current_hour(now=None):
+    return int((time.time() if now is None else now) // HOUR)
+
+
+class ActivityRecorder:
+    """Hourly message counters per user and per channel, written behind.
+
+    `record` only bumps an in-memory bucket; buckets are upserted in one batch
+    every `flush_interval` seconds. Every `compact_interval` seconds, hourly
+    buckets older than `hourly_weeks` weeks are rolled up into daily buckets
+    and days older than `retention_days` are deleted, which bounds the size
+    of the history on disk.
+    """
+
+    def __init__(self, storage, flush_interval=30.0, hourly_weeks=4, retention_days=400,
+                 compact_interval=6 * HOUR):
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.hourly_weeks = hourly_weeks
+        self.retention_days = retention_days
+        self.compact_interval = compact_interval
+        self._pending = {}
+        self._flush_lock = asyncio.Lock()
+        self._last_compact = 0.0
+        self._task = None
+
+    def record(self, user_id, channel_id, now=None):
+        hour = current_hour(now)
+        pending = self._pending
+        key = (USER, user_id, hour)
+        pending[key] = pending.get(key, 0) + 1
+        key = (CHANNEL, channel_id, hour)
+        pending[key] = pending.get(key, 0) + 1
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            try:
+                await self.storage.add_activity(batch)
+            except Exception:
+                for key, count in batch.items():
+                    self._pending[key] = self._pending.get(key, 0) + count
+                raise
+
+    async def compact(self):
+        hour = current_hour()
+        await self.storage.compact_activity(hour - self.hourly_weeks * 7 * 24,
+                                            hour // 24 - self.retention_days)
+        self._last_compact = time.monotonic()
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+                if time.monotonic() - self._last_compact >= self.compact_interval:
+                    await self.compact()
+            except Exception as e:
+                print(f"⚠️ Failed to flush activity history: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._last_compact = time.monotonic() - self.compact_interval
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
@@ -0,0 +1,178 @@
+import time
+
+# Reasons a message can be flagged
+RATE = "rate"
+DUPLICATE = "duplicate"
+MENTIONS = "mentions"
+
+
+class RingWindow:
+    """Timestamps of the last `size` events, in a fixed-size ring.
+
+    `add` reports whether `size` events (including this one) happened within
+    `window` seconds: that is the case exactly when the entry being
+    overwritten is still inside the window. Constant memory and O(1).
+    """
+
+    __slots__ = ("times", "head", "window")
+
+    def __init__(self, size, window):
+        self.times = [float("-inf")] * size
+        self.head = 0
+        self.window = window
+
+    def add(self, now):
+        oldest = self.times[self.head]
+        self.times[self.head] = now
+        self.head = (self.head + 1) % len(self.times)
+        return now - oldest <= self.window
+
+
+class UserState:
+    __slots__ = ("rate", "fingerprints", "fingerprint_times", "fingerprint_head",
+                 "recent", "recent_head", "last_seen", "flagged_until")
+
+    def __init__(self, rate_count, rate_window, history):
+        self.rate = RingWindow(rate_count, rate_window)
+        self.fingerprints = [0] * history
+        self.fingerprint_times = [float("-inf")] * history
+        self.fingerprint_head = 0
+        # (time, channel_id, message_id, fingerprint) of the most recent
+        # messages, for deleting a burst
+        self.recent = [None] * rate_count
+        self.recent_head = 0
+        self.last_seen = 0.0
+        self.flagged_until = 0.0
+
+
+class ChannelState:
+    __slots__ = ("rate", "last_seen", "slowed_until")
+
+    def __init__(self, rate_count, rate_window):
+        self.rate = RingWindow(rate_count, rate_window)
+        self.last_seen = 0.0
+        self.slowed_until = 0.0
+
+
+class Verdict:
+    __slots__ = ("reason", "new", "recent_messages")
+
+    def __init__(self, reason, new, recent_messages):
+        self.reason = reason
+        # False while the user is still inside the cooldown of an earlier flag
+        self.new = new
+        self.recent_messages = recent_messages
+
+
+class FloodDetector:
+    """Sliding-window flood and spam detection for on_message.
+
+    Per user: more than `user_rate` messages in `user_window` seconds,
+    `duplicate_count` identical messages within `duplicate_window` seconds
+    (compared by content hash), or `mention_limit` mentions in one message.
+    Per channel: `channel_rate` messages in `channel_window` seconds.
+
+    State for users and channels idle for `idle_ttl` seconds is dropped by
+    an occasional sweep, so memory is bounded by recent activity.
+    """
+
+    def __init__(self, user_rate=8, user_window=5.0, duplicate_count=4, duplicate_window=30.0,
+                 mention_limit=6, channel_rate=40, channel_window=10.0, cooldown=60.0,
+                 idle_ttl=300.0, duplicate_history=8):
+        self.user_rate = user_rate
+        self.user_window = user_window
+        self.duplicate_count = duplicate_count
+        self.duplicate_window = duplicate_window
+        self.mention_limit = mention_limit
+        self.channel_rate = channel_rate
+        self.channel_window = channel_window
+        self.cooldown = cooldown
+        self.idle_ttl = idle_ttl
+        self.duplicate_history = duplicate_history
+        self.users = {}
+        self.channels = {}
+        self._last_sweep = time.monotonic()
+
+    def check(self, user_id, channel_id, message_id, content, mention_count, now=None):
+        """Record a message and return a Verdict if it should be treated as spam."""
+        if now is None:
+            now = time.monotonic()
+        if now - self._last_sweep > self.idle_ttl:
+            self.sweep(now)
+
+        user = self.users.get(user_id)
+        if user is None:
+            user = self.users[user_id] = UserState(self.user_rate, self.user_window, self.duplicate_history)
+        user.last_seen = now
+
+        reason = None
+        rate_hit = user.rate.add(now)
+        if rate_hit:
+            reason = RATE
+        if mention_count >= self.mention_limit:
+            reason = MENTIONS
+        fingerprint = None
+        duplicate_hit = False
+        if content:
+            fingerprint = hash(content.strip().lower())
+            matches = 1
+            for i in range(self.duplicate_history):
+                if user.fingerprints[i] == fingerprint and now - user.fingerprint_times[i] <= self.duplicate_window:
+                    matches += 1
+            head = user.fingerprint_head
+            user.fingerprints[head] = fingerprint
+            user.fingerprint_times[head] = now
+            user.fingerprint_head = (head + 1) % self.duplicate_history
+            if matches >= self.duplicate_count:
+                duplicate_hit = True
+                reason = reason or DUPLICATE
+        user.recent[user.recent_head] = (now, channel_id, message_id, fingerprint)
+        user.recent_head = (user.recent_head + 1) % len(user.recent)
+
+        if reason is None:
+            if now < user.flagged_until:
+                # Still cooling down from a flag: keep excluding the burst.
+                return Verdict(reason=RATE, new=False, recent_messages=())
+            return None
+
+        new = now >= user.flagged_until
+        user.flagged_until = now + self.cooldown
+        recent = self._burst(user, now, message_id, rate_hit, duplicate_hit, fingerprint) if new else ()
+        return Verdict(reason, new, recent)
+
+    def _burst(self, user, now, message_id, rate_hit, duplicate_hit, fingerprint):
+        """(channel_id, message_id) of the messages that tripped a check: the
+        ones inside the rate window, the duplicates inside the duplicate
+        window, and always the current message (the only one for mention spam)."""
+        burst = []
+        for entry in user.recent:
+            if entry is None:
+                continue
+            sent, channel_id, recent_id, recent_fingerprint = entry
+            if (recent_id == message_id
+                    or (rate_hit and now - sent <= self.user_window)
+                    or (duplicate_hit and recent_fingerprint == fingerprint and now - sent <= self.duplicate_window)):
+                burst.append((channel_id, recent_id))
+        return burst
+
+    def check_channel(self, channel_id, now=None):
+        """Record a message in a channel; True if the channel just started flooding."""
+        if now is None:
+            now = time.monotonic()
+        channel = self.channels.get(channel_id)
+        if channel is None:
+            channel = self.channels[channel_id] = ChannelState(self.channel_rate, self.channel_window)
+        channel.last_seen = now
+        if channel.rate.add(now) and now >= channel.slowed_until:
+            channel.slowed_until = now + self.cooldown
+            return True
+        return False
+
+    def sweep(self, now=None):
+        if now is None:
+            now = time.monotonic()
+        self._last_sweep = now
+        for states in (self.users, self.channels):
+            idle = [key for key, state in states.items() if now - state.last_seen > self.idle_ttl]
+            for key in idle:
+                del states[key]
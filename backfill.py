@@ -0,0 +1,159 @@
+import asyncio
+import time
+from datetime import datetime
+
+import discord
+
+RUNNING = "running"
+MERGED = "merged"
+CUTOFF_KEY = "backfill_cutoff"
+STATE_KEY = "backfill_state"
+
+
+class BackfillJob:
+    """Counts historical messages sent before `cutoff` (when live counting
+    started), so the totals include messages the bot never saw.
+
+    Channels are walked newest-to-oldest, `concurrency` at a time. Each page
+    of history is aggregated into per-user counts and saved together with
+    the channel's checkpoint, so nothing but the current page is held in
+    memory and a restart resumes after the last saved page; a server error
+    restarts the channel from there, up to `retries` times. When every
+    channel is done, the counts are merged into the live totals through
+    `counters` (a CounterStore) and `on_complete(merged_counts)` is awaited.
+    """
+
+    def __init__(self, storage, counters, on_complete, concurrency=3, page_size=100, page_delay=0.5,
+                 retries=5, retry_delay=2.0):
+        self.storage = storage
+        self.counters = counters
+        self.on_complete = on_complete
+        self.concurrency = concurrency
+        self.page_size = page_size
+        self.page_delay = page_delay
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.cutoff = None
+        self.started_at = None
+        self.channels_total = 0
+        self.channels_done = 0
+        self.scanned = 0
+        self.error = None
+        self._task = None
+
+    @property
+    def running(self):
+        return self._task is not None and not self._task.done()
+
+    async def pending_cutoff(self):
+        """The cutoff of a backfill that was interrupted by a restart, if any."""
+        if await self.storage.get_meta(STATE_KEY) == RUNNING:
+            return datetime.fromisoformat(await self.storage.get_meta(CUTOFF_KEY))
+        return None
+
+    async def start(self, channels, cutoff):
+        if self.running:
+            raise RuntimeError("A backfill is already running.")
+        if await self.storage.get_meta(STATE_KEY) == MERGED:
+            # Counting the same history again would double every total.
+            raise RuntimeError("Historical messages have already been backfilled.")
+        pending = await self.pending_cutoff()
+        if pending is not None and pending != cutoff:
+            # A different cutoff would mix counts from two ranges.
+            await self.storage.reset_backfill()
+        await self.storage.set_meta(CUTOFF_KEY, cutoff.isoformat())
+        await self.storage.set_meta(STATE_KEY, RUNNING)
+        self.cutoff = cutoff
+        self.error = None
+        self.started_at = time.monotonic()
+        self._task = asyncio.create_task(self._run(channels))
+
+    async def cancel(self):
+        """Stop the job; checkpoints are kept so `start` resumes it later."""
+        if self.running:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self, channels):
+        checkpoints = await self.storage.backfill_checkpoints()
+        self.channels_total = len(channels)
+        self.channels_done = sum(1 for channel in channels if checkpoints.get(channel.id, (None, 0, False))[2])
+        self.scanned = sum(scanned for _, scanned, _ in checkpoints.values())
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def walk(channel):
+            before_id, _, done = checkpoints.get(channel.id, (None, 0, False))
+            if done:
+                return
+            async with semaphore:
+                await self._walk_channel(channel, before_id)
+            self.channels_done += 1
+
+        walkers = [asyncio.create_task(walk(channel)) for channel in channels]
+        try:
+            await asyncio.gather(*walkers)
+        except BaseException as e:
+            # Stop the other channels too: a walker left running would keep
+            # saving pages that a restarted job then counts a second time.
+            for walker in walkers:
+                walker.cancel()
+            await asyncio.gather(*walkers, return_exceptions=True)
+            if isinstance(e, Exception):
+                self.error = e
+                print(f"⚠️ Backfill stopped: {e}")
+            raise
+
+        # The merge commits in the storage thread even if we are cancelled
+        # while waiting for it, so let it finish (including the cache update)
+        # before honouring the cancel.
+        merge = asyncio.ensure_future(
+            self.counters.merge(lambda: self.storage.merge_backfill(STATE_KEY, MERGED)))
+        try:
+            merged = await asyncio.shield(merge)
+        except asyncio.CancelledError:
+            await merge
+            raise
+        await self.on_complete(merged)
+
+    async def _walk_channel(self, channel, before_id):
+        attempt = 0
+        while True:
+            before = discord.Object(id=before_id) if before_id else self.cutoff
+            counts, scanned, last_id = {}, 0, before_id
+            try:
+                async for message in channel.history(limit=None, before=before, oldest_first=False):
+                    scanned += 1
+                    last_id = message.id
+                    if not message.author.bot:
+                        counts[message.author.id] = counts.get(message.author.id, 0) + 1
+                    if scanned == self.page_size:
+                        await self.storage.save_backfill_page(channel.id, last_id, scanned, counts)
+                        self.scanned += scanned
+                        before_id, attempt = last_id, 0
+                        counts, scanned = {}, 0
+                        await asyncio.sleep(self.page_delay)
+            except discord.Forbidden:
+                pass
+            except discord.HTTPException as e:
+                # Server errors are usually transient: start again after the
+                # last saved page; the unsaved part of this one is dropped.
+                if e.status < 500 or attempt >= self.retries:
+                    raise
+                attempt += 1
+                await asyncio.sleep(self.retry_delay * 2 ** (attempt - 1))
+                continue
+            break
+        await self.storage.save_backfill_page(channel.id, last_id, scanned, counts, done=True)
+        self.scanned += scanned
+
+    def status(self):
+        if not self.running:
+            return None
+        elapsed = time.monotonic() - self.started_at
+        return (f"Channels: {self.channels_done}/{self.channels_total}\n"
+                f"Messages scanned: {self.scanned:,}\n"
+                f"Before: {discord.utils.format_dt(self.cutoff)}\n"
+                f"Running for {int(elapsed // 60)}m {int(elapsed % 60)}s")
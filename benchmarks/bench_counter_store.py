@@ -0,0 +1,76 @@
+"""Per-message cost of counting messages as the number of known users grows.
+
+Compares the old approach (rewrite message_counts.json on every message) with
+the write-behind CounterStore on top of the SQLite Storage. Run from the repository root:
+
+    python benchmarks/bench_counter_store.py
+"""
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from counter_store import CounterStore  # noqa: E402
+from storage import Storage  # noqa: E402
+
+USER_COUNTS = [1_000, 10_000, 50_000, 100_000]
+MESSAGES = 2_000
+
+
+def seed(path, users):
+    with open(path, "w") as f:
+        json.dump({str(i): random.randint(0, 6000) for i in range(users)}, f)
+
+
+def bench_rewrite(path, users):
+    with open(path) as f:
+        counts = json.load(f)
+    ids = [str(random.randrange(users)) for _ in range(MESSAGES)]
+    start = time.perf_counter()
+    for user_id in ids:
+        counts[user_id] = counts.get(user_id, 0) + 1
+        with open(path, "w") as f:
+            json.dump(counts, f)
+    return (time.perf_counter() - start) / MESSAGES
+
+
+async def bench_write_behind(path, users):
+    storage = Storage(path + ".db")
+    await storage.open()
+    await storage.import_json(path)
+    store = CounterStore(storage, flush_interval=3600)
+    # Realistic traffic: most messages come from a small set of active users.
+    active = [random.randrange(users) for _ in range(200)]
+    ids = [random.choice(active) if random.random() < 0.9 else random.randrange(users)
+           for _ in range(MESSAGES)]
+    start = time.perf_counter()
+    for user_id in ids:
+        await store.incr(user_id)
+    per_message = (time.perf_counter() - start) / MESSAGES
+    flush_start = time.perf_counter()
+    await store.close()
+    flush = time.perf_counter() - flush_start
+    await storage.close()
+    return per_message, flush
+
+
+def main():
+    print(f"{'users':>8}  {'rewrite/msg':>12}  {'write-behind/msg':>17}  {'flush':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for users in USER_COUNTS:
+            path = os.path.join(tmp, f"counts_{users}.json")
+            seed(path, users)
+            # Rewriting 50k+ users per message takes minutes; skip the large sizes.
+            rewrite = bench_rewrite(path, users) if users <= 10_000 else float("nan")
+            seed(path, users)
+            per_message, flush = asyncio.run(bench_write_behind(path, users))
+            print(f"{users:>8}  {rewrite * 1e6:>10.1f}us  {per_message * 1e6:>15.2f}us  {flush * 1e3:>7.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Cost of a permission check as members hold more roles.
+
+Compares the old role scans (`is_staff` + `can_ban` walking `member.roles`)
+with PermissionResolver lookups: the first (uncached) resolution and the
+cached lookups every later command pays.
+
+    python benchmarks/bench_permissions.py
+"""
+import os
+import sys
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from permissions import PermissionResolver, load_config  # noqa: E402
+
+STAFF_ROLE_IDS = {
+    "trial_mod": 1413202670033965097,
+    "staff": 802672046659993670,
+    "manager": 802671985796710460,
+    "ex_chairman": 968604883668312095,
+    "head_manager": 1412887734976254032,
+    "chairman": 802671745332412456,
+    "founder": 1402031729820172400,
+}
+ROLE_COUNTS = (1, 10, 50, 250)
+MEMBERS = 1000
+LOOKUPS = 200_000
+
+
+def legacy_is_staff(member):
+    return any(role.id in STAFF_ROLE_IDS.values() for role in member.roles)
+
+
+def legacy_can_ban(member):
+    return legacy_is_staff(member) and STAFF_ROLE_IDS["trial_mod"] not in [role.id for role in member.roles]
+
+
+def make_members(role_count):
+    # Ordinary roles first, the staff role last: the worst case for a scan.
+    roles = [SimpleNamespace(id=10_000 + i, position=i) for i in range(role_count - 1)]
+    staff = SimpleNamespace(id=STAFF_ROLE_IDS["staff"], position=role_count)
+    return [SimpleNamespace(id=i, roles=[*roles, staff]) for i in range(MEMBERS)]
+
+
+def per_call_ns(fn, members, calls):
+    start = time.perf_counter()
+    for i in range(calls):
+        fn(members[i % MEMBERS])
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main():
+    env = {}
+    print(f"{'roles':>6} {'legacy':>10} {'uncached':>10} {'cached':>10}")
+    for role_count in ROLE_COUNTS:
+        members = make_members(role_count)
+        legacy = per_call_ns(lambda member: legacy_is_staff(member) and legacy_can_ban(member), members, LOOKUPS // role_count)
+
+        resolver = PermissionResolver(load_config(env, STAFF_ROLE_IDS))
+        uncached = per_call_ns(lambda member: resolver.can(member, "ban"), members, MEMBERS)
+        assert all(resolver.can(member, "ban") for member in members)
+        cached = per_call_ns(lambda member: resolver.is_staff(member) and resolver.can(member, "ban"), members, LOOKUPS)
+        print(f"{role_count:>6} {legacy:>8.0f}ns {uncached:>8.0f}ns {cached:>8.0f}ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""Stand-ins for the discord.py objects bot.py touches, backed by a fake REST
+layer that sleeps for a configurable latency and counts every call.
+
+Only the attributes and methods the handlers actually use are implemented.
+"""
+import asyncio
+import itertools
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+_ids = itertools.count(10**17)
+
+
+def next_id():
+    return next(_ids)
+
+
+class FakeRest:
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.calls = Counter()
+
+    async def call(self, name):
+        self.calls[name] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    @property
+    def total(self):
+        return sum(self.calls.values())
+
+
+class FakeAsset:
+    url = ""
+
+
+class FakeRole:
+    def __init__(self, role_id, name, position=1, default=False):
+        self.id = role_id
+        self.name = name
+        self.position = position
+        self._default = default
+        self.mention = f"<@&{role_id}>"
+
+    def is_default(self):
+        return self._default
+
+    def __ge__(self, other):
+        return self.position >= other.position
+
+    def __gt__(self, other):
+        return self.position > other.position
+
+    def __eq__(self, other):
+        return isinstance(other, FakeRole) and other.id == self.id
+
+    def __hash__(self):
+        return hash(self.id)
+
+    def __str__(self):
+        return self.name
+
+
+class FakeGuild:
+    def __init__(self, guild_id, rest):
+        self.id = guild_id
+        self.rest = rest
+        self.default_role = FakeRole(guild_id, "@everyone", position=0, default=True)
+        self.roles = {guild_id: self.default_role}
+        self.members = {}
+
+    def add_role(self, role_id, name, position=1):
+        role = FakeRole(role_id, name, position)
+        self.roles[role_id] = role
+        return role
+
+    def get_role(self, role_id):
+        return self.roles.get(role_id)
+
+    def get_member(self, member_id):
+        return self.members.get(member_id)
+
+
+class FakeMember:
+    def __init__(self, guild, name=None, roles=(), account_age_days=400, bot=False, member_id=None):
+        self.id = member_id or next_id()
+        self.name = name or f"user{self.id % 100000}"
+        self.guild = guild
+        self.bot = bot
+        self.nick = None
+        self.roles = [guild.default_role, *roles]
+        self.created_at = datetime.now(timezone.utc) - timedelta(days=account_age_days)
+        self.joined_at = datetime.now(timezone.utc)
+        self.timed_out_until = None
+        self.display_avatar = FakeAsset()
+        self.mention = f"<@{self.id}>"
+        guild.members[self.id] = self
+
+    def __str__(self):
+        return self.name
+
+    def copy(self):
+        clone = object.__new__(FakeMember)
+        clone.__dict__.update(self.__dict__)
+        clone.roles = list(self.roles)
+        return clone
+
+    @property
+    def top_role(self):
+        return max(self.roles, key=lambda role: role.position)
+
+    def get_role(self, role_id):
+        return next((role for role in self.roles if role.id == role_id), None)
+
+    async def add_roles(self, *roles, reason=None, atomic=True):
+        # Like discord.py: one request per role, or a single member edit
+        # with the combined role list when atomic=False.
+        if atomic:
+            for _ in roles:
+                await self.guild.rest.call("add_roles")
+        else:
+            await self.guild.rest.call("edit_member")
+        self.roles.extend(role for role in roles if role not in self.roles)
+
+    async def remove_roles(self, *roles, reason=None, atomic=True):
+        if atomic:
+            for _ in roles:
+                await self.guild.rest.call("remove_roles")
+        else:
+            await self.guild.rest.call("edit_member")
+        self.roles = [role for role in self.roles if role not in roles]
+
+    async def edit(self, *, roles=None, nick=None, timed_out_until=None, reason=None):
+        await self.guild.rest.call("edit_member")
+        if roles is not None:
+            self.roles = [self.guild.default_role, *(role for role in roles if not role.is_default())]
+        if nick is not None:
+            self.nick = nick
+        if timed_out_until is not None:
+            self.timed_out_until = timed_out_until
+
+    async def kick(self, reason=None):
+        await self.guild.rest.call("kick")
+        self.guild.members.pop(self.id, None)
+
+    async def ban(self, reason=None):
+        await self.guild.rest.call("ban")
+        self.guild.members.pop(self.id, None)
+
+
+class FakeMessage:
+    def __init__(self, author, channel, content="", attachments=(), mentions=(), created_at=None):
+        self.id = next_id()
+        self.author = author
+        self.channel = channel
+        self.guild = channel.guild
+        self.content = content
+        self.attachments = list(attachments)
+        self.mentions = list(mentions)
+        self.raw_mentions = [member.id for member in self.mentions]
+        self.role_mentions = []
+        self.mention_everyone = False
+        self.pinned = False
+        self.created_at = created_at or datetime.now(timezone.utc)
+
+    async def delete(self):
+        await self.guild.rest.call("delete_message")
+        self.channel.messages.remove(self)
+
+
+class FakeChannel:
+    def __init__(self, guild, name="general"):
+        self.id = next_id()
+        self.guild = guild
+        self.name = name
+        self.mention = f"<#{self.id}>"
+        self.messages = []
+        self.slowmode_delay = 0
+
+    async def send(self, content=None, **kwargs):
+        await self.guild.rest.call("send_message")
+        return FakeSentMessage(self, content)
+
+    async def set_permissions(self, target, **overwrites):
+        await self.guild.rest.call("set_permissions")
+
+    async def edit(self, **kwargs):
+        await self.guild.rest.call("edit_channel")
+        self.slowmode_delay = kwargs.get("slowmode_delay", self.slowmode_delay)
+
+    async def delete_messages(self, messages, reason=None):
+        await self.guild.rest.call("bulk_delete")
+        doomed = {message.id for message in messages}
+        self.messages = [message for message in self.messages if message.id not in doomed]
+
+    async def history(self, limit=100, before=None, after=None, oldest_first=False):
+        messages = self.messages if oldest_first else list(reversed(self.messages))
+        for index, message in enumerate(messages):
+            if limit is not None and index >= limit:
+                return
+            if index % 100 == 0:
+                await self.guild.rest.call("history")
+            if before and message.created_at >= before:
+                continue
+            if after and message.created_at <= after:
+                continue
+            yield message
+
+
+class FakeSentMessage:
+    def __init__(self, channel, content):
+        self.id = next_id()
+        self.channel = channel
+        self.content = content
+
+    async def edit(self, **kwargs):
+        await self.channel.guild.rest.call("edit_message")
+
+
+class FakeResponse:
+    def __init__(self, rest):
+        self.rest = rest
+        self._done = False
+
+    def is_done(self):
+        return self._done
+
+    async def defer(self, ephemeral=False, thinking=False):
+        await self.rest.call("interaction_defer")
+        self._done = True
+
+    async def send_message(self, content=None, **kwargs):
+        await self.rest.call("interaction_response")
+        self._done = True
+
+
+class FakeFollowup:
+    def __init__(self, channel):
+        self.channel = channel
+
+    async def send(self, content=None, **kwargs):
+        await self.channel.guild.rest.call("interaction_followup")
+        return FakeSentMessage(self.channel, content)
+
+
+class FakeInteraction:
+    def __init__(self, user, channel):
+        self.user = user
+        self.channel = channel
+        self.guild = channel.guild
+        self.response = FakeResponse(channel.guild.rest)
+        self.followup = FakeFollowup(channel)
+
+    async def edit_original_response(self, **kwargs):
+        await self.guild.rest.call("interaction_edit")
@@ -0,0 +1,92 @@
+"""Measure resident memory and gateway events/sec for each intents profile.
+
+Connects with the bot token from .env once per profile, in a fresh process
+each time, and reports RSS and the gateway event rate after a warm-up.
+The bot's handlers are not loaded, so nothing is modified on the server.
+
+    python benchmarks/measure_intents.py [--seconds 120] [--profiles full minimal lean]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except FileNotFoundError:
+        pass
+    import resource
+    # ru_maxrss is the peak, in KiB on Linux and bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_profile(profile, seconds):
+    import discord
+    from dotenv import load_dotenv
+    from gateway_profiles import client_options
+
+    load_dotenv()
+    client = discord.Client(**client_options(profile))
+    events = Counter()
+    result = {}
+
+    @client.event
+    async def on_socket_event_type(event_type):
+        events[event_type] += 1
+
+    @client.event
+    async def on_ready():
+        events.clear()
+        start_rss = rss_mb()
+        start = time.perf_counter()
+        await asyncio.sleep(seconds)
+        elapsed = time.perf_counter() - start
+        result.update(
+            profile=profile,
+            ready_rss_mb=round(start_rss, 1),
+            rss_mb=round(rss_mb(), 1),
+            events_per_sec=round(sum(events.values()) / elapsed, 2),
+            top_events=events.most_common(5),
+            cached_members=sum(len(g.members) for g in client.guilds),
+        )
+        await client.close()
+
+    client.run(os.getenv("DISCORD_TOKEN"), log_handler=None)
+    print(json.dumps(result))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=int, default=120)
+    parser.add_argument("--profiles", nargs="+", default=["full", "minimal", "lean"])
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_profile(args.child, args.seconds)
+        return
+
+    print(f"{'profile':<8}  {'RSS at ready':>12}  {'RSS after':>10}  {'events/s':>9}  {'members':>8}  top events")
+    for profile in args.profiles:
+        out = subprocess.run([sys.executable, __file__, "--child", profile, "--seconds", str(args.seconds)],
+                             capture_output=True, text=True, check=True).stdout
+        r = json.loads(out.strip().splitlines()[-1])
+        top = ", ".join(f"{name}={count}" for name, count in r["top_events"])
+        print(f"{profile:<8}  {r['ready_rss_mb']:>10.1f}MB  {r['rss_mb']:>8.1f}MB  "
+              f"{r['events_per_sec']:>9.2f}  {r['cached_members']:>8}  {top}")
+
+
+if __name__ == "__main__":
+    main()
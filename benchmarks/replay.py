@@ -0,0 +1,281 @@
+"""Offline event-replay benchmark for bot.py's handlers.
+
+Replays synthetic (or recorded) traffic through on_message, on_member_join,
+on_member_update and the shared command implementations, using the stand-in
+objects in benchmarks/fakes.py instead of a Discord connection. Reports
+events/sec, per-handler latency percentiles, REST calls per event and memory
+growth.
+
+    python benchmarks/replay.py --messages 20000 --joins 500 --verifications 500 --commands 200
+    python benchmarks/replay.py --trace traffic.jsonl --rest-latency 80
+
+A trace is JSON lines such as:
+
+    {"type": "message", "user": 1, "channel": 1, "content": "hello"}
+    {"type": "join", "user": 2, "account_age_days": 3}
+    {"type": "verify", "user": 2, "role": "PL"}
+    {"type": "command", "user": 3, "command": "timeout", "target": 1}
+
+Pass --max-p99-ms and/or --max-rest-per-event to use it as a regression gate;
+the exit status is 1 when a limit is exceeded.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import (FakeChannel, FakeGuild, FakeInteraction, FakeMember,  # noqa: E402
+                   FakeMessage, FakeRest)
+
+
+def percentile(ordered, p):
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+class Replay:
+    def __init__(self, lfc, rest, concurrency):
+        self.lfc = lfc
+        self.rest = rest
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.latencies = defaultdict(list)
+        self.events = 0
+        self.tasks = set()
+
+        self.guild = FakeGuild(lfc.GUILD_ID, rest)
+        self.unverified = self.guild.add_role(lfc.UNVERIFIED_ROLE_ID, "Unverified")
+        self.guild.add_role(lfc.VERIFIED_ROLE_ID, "Verified")
+        self.guild.add_role(lfc.AUTOROLE_ID, "25/26 Season")
+        self.guild.add_role(lfc.TRUSTED_ROLE_ID, "Trusted")
+        self.club_roles = {name: self.guild.add_role(role_id, name) for role_id, name in lfc.ROLE_NAME_MAP.items()}
+        staff_role = self.guild.add_role(lfc.STAFF_ROLE_IDS["manager"], "Manager", position=50)
+
+        self.channels = [FakeChannel(self.guild, f"channel-{i}") for i in range(10)]
+        self.log_channel = FakeChannel(self.guild, "logs")
+        self.staff = [FakeMember(self.guild, f"staff{i}", roles=[staff_role]) for i in range(5)]
+        self.members = {}
+
+        lfc.bot._connection.user = FakeMember(self.guild, "LFC Bot", bot=True)
+        # Without a gateway connection there is nothing to build a prefix
+        # command Context from, and the heartbeat latency is NaN.
+        lfc.bot.process_commands = self.process_commands
+        type(lfc.bot).latency = property(lambda bot: 0.05)
+        lfc.log_dispatcher.get_channel = lambda: self.log_channel
+        # Measure log sends as REST calls without the real per-channel pacing.
+        lfc.log_dispatcher.per = 0
+
+    async def process_commands(self, message):
+        pass
+
+    def member(self, key, **kwargs):
+        member = self.members.get(key)
+        if member is None:
+            member = self.members[key] = FakeMember(self.guild, **kwargs)
+        return member
+
+    def dispatch(self, handler_name, coro_factory):
+        async def run():
+            async with self.semaphore:
+                start = time.perf_counter()
+                try:
+                    await coro_factory()
+                finally:
+                    self.latencies[handler_name].append(time.perf_counter() - start)
+
+        self.events += 1
+        task = asyncio.create_task(run())
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    # --- Event types ---
+    def message(self, user, channel=0, content="hello"):
+        author = self.member(user)
+        message = FakeMessage(author, self.channels[channel % len(self.channels)], content)
+        self.dispatch("on_message", lambda: self.lfc.on_message(message))
+
+    def join(self, user, account_age_days=400):
+        member = self.member(user, account_age_days=account_age_days)
+        self.dispatch("on_member_join", lambda: self.lfc.on_member_join(member))
+
+    def verify(self, user, role="PL"):
+        member = self.member(user, roles=[self.unverified])
+        before = member.copy()
+        member.roles.append(self.club_roles.get(role, next(iter(self.club_roles.values()))))
+        self.dispatch("on_member_update", lambda: self.lfc.on_member_update(before, member))
+
+    def command(self, user, command="timeout", target=None):
+        lfc = self.lfc
+        actor = self.staff[user % len(self.staff)]
+        channel = self.channels[user % len(self.channels)]
+        target_member = self.member(target if target is not None else random.randrange(10**6))
+        implementations = {
+            "kick": (lfc.kick_core, (target_member, "replay")),
+            "ban": (lfc.ban_core, (target_member, "replay")),
+            "timeout": (lfc.timeout_core, (target_member, "10m", "replay")),
+            "lock": (lfc.lock_core, ()),
+            "unlock": (lfc.unlock_core, ()),
+            "say": (lfc.say_core, ("replay",)),
+            "ping": (lfc.ping_core, ()),
+        }
+        implementation, args = implementations[command]
+
+        def run():
+            cmd = lfc.CommandContext.from_interaction(command, FakeInteraction(actor, channel))
+            return lfc.run_command(cmd, implementation, *args)
+        self.dispatch(f"/{command}", run)
+
+    def apply(self, event):
+        event = dict(event)
+        kind = event.pop("type")
+        getattr(self, kind)(**event)
+
+
+def synthetic_events(args):
+    rng = random.Random(args.seed)
+    events = []
+    # Most traffic comes from a small group of regulars.
+    regulars = [rng.randrange(args.users) for _ in range(max(1, args.users // 20))]
+    for _ in range(args.messages):
+        user = rng.choice(regulars) if rng.random() < 0.8 else rng.randrange(args.users)
+        events.append({"type": "message", "user": user, "channel": rng.randrange(10),
+                       "content": f"message {rng.random():.6f}"})
+    join_ids = [args.users + i for i in range(args.joins)]
+    for user in join_ids:
+        events.append({"type": "join", "user": user, "account_age_days": rng.choice([3, 45, 400, 2000])})
+    for i in range(args.verifications):
+        events.append({"type": "verify", "user": args.users + args.joins + i,
+                       "role": rng.choice(["PL", "Liverpool", "Neutral", "La Liga"])})
+    for _ in range(args.commands):
+        events.append({"type": "command", "user": rng.randrange(5),
+                       "command": rng.choice(["timeout", "timeout", "kick", "say", "lock", "unlock", "ping"]),
+                       "target": rng.randrange(args.users)})
+    rng.shuffle(events)
+    return events
+
+
+def load_trace(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+async def run(args, lfc):
+    rest = FakeRest(args.rest_latency / 1000)
+    replay = Replay(lfc, rest, args.concurrency)
+    events = load_trace(args.trace) if args.trace else synthetic_events(args)
+
+    await lfc.storage.open()
+    lfc.message_counts.start()
+    lfc.log_dispatcher.start()
+    lfc.join_queue.start()
+
+    tracemalloc.start()
+    start_mem = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    for event in events:
+        replay.apply(event)
+        # Yield so handlers run interleaved with dispatch, as on the gateway.
+        if replay.events % 100 == 0:
+            await asyncio.sleep(0)
+    await asyncio.gather(*list(replay.tasks))
+    handled = time.perf_counter() - start
+    await lfc.join_queue.join()
+    await lfc.message_counts.flush()
+    drained = time.perf_counter() - start
+    current_mem, peak_mem = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    await lfc.join_queue.close()
+    await lfc.log_dispatcher.close()
+    await lfc.message_counts.close()
+    await lfc.storage.close()
+
+    report = {
+        "events": replay.events,
+        "seconds": round(drained, 3),
+        "events_per_sec": round(replay.events / handled, 1),
+        "rest_latency_ms": args.rest_latency,
+        "rest_calls": dict(rest.calls),
+        "rest_calls_per_event": round(rest.total / max(1, replay.events), 3),
+        "memory_growth_kb": round((current_mem - start_mem) / 1024, 1),
+        "memory_peak_kb": round((peak_mem - start_mem) / 1024, 1),
+        "handlers": {},
+    }
+    for name, samples in sorted(replay.latencies.items()):
+        ordered = sorted(samples)
+        report["handlers"][name] = {
+            "count": len(ordered),
+            "p50_ms": round(percentile(ordered, 50) * 1000, 3),
+            "p95_ms": round(percentile(ordered, 95) * 1000, 3),
+            "p99_ms": round(percentile(ordered, 99) * 1000, 3),
+        }
+    return report
+
+
+def print_report(report):
+    print(f"{report['events']} events in {report['seconds']}s "
+          f"({report['events_per_sec']} events/s handled, REST latency {report['rest_latency_ms']}ms)")
+    print(f"\n{'handler':<18} {'count':>7} {'p50':>10} {'p95':>10} {'p99':>10}")
+    for name, stats in report["handlers"].items():
+        print(f"{name:<18} {stats['count']:>7} {stats['p50_ms']:>8.2f}ms {stats['p95_ms']:>8.2f}ms {stats['p99_ms']:>8.2f}ms")
+    print(f"\nREST calls per event: {report['rest_calls_per_event']}")
+    for name, count in sorted(report["rest_calls"].items(), key=lambda item: -item[1]):
+        print(f"  {name:<22} {count}")
+    print(f"\nMemory growth: {report['memory_growth_kb']} KB (peak {report['memory_peak_kb']} KB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--trace", help="JSON lines file of recorded events")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--joins", type=int, default=500)
+    parser.add_argument("--verifications", type=int, default=500)
+    parser.add_argument("--commands", type=int, default=200)
+    parser.add_argument("--rest-latency", type=float, default=50, help="fake REST latency in ms")
+    parser.add_argument("--concurrency", type=int, default=500, help="max handlers in flight")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--max-p99-ms", type=float, help="fail if any handler's p99 exceeds this")
+    parser.add_argument("--max-rest-per-event", type=float, help="fail if REST calls per event exceed this")
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp(prefix="lfc-replay-")
+    os.environ.setdefault("DISCORD_TOKEN", "replay")
+    os.environ["DATABASE_FILE"] = os.path.join(tmp, "replay.db")
+    os.environ["METRICS_PORT"] = "0"
+    os.chdir(tmp)  # keep the legacy JSON import away from a real message_counts.json
+    from dotenv import load_dotenv
+    load_dotenv(os.path.join(ROOT, ".env"))
+    import bot as lfc
+
+    report = asyncio.run(run(args, lfc))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+    failed = False
+    if args.max_p99_ms is not None:
+        for name, stats in report["handlers"].items():
+            if stats["p99_ms"] > args.max_p99_ms:
+                print(f"FAIL: {name} p99 {stats['p99_ms']}ms > {args.max_p99_ms}ms", file=sys.stderr)
+                failed = True
+    if args.max_rest_per_event is not None and report["rest_calls_per_event"] > args.max_rest_per_event:
+        print(f"FAIL: {report['rest_calls_per_event']} REST calls/event > {args.max_rest_per_event}", file=sys.stderr)
+        failed = True
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
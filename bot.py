@@ -1,11 +1,33 @@
 import os
+import re
+import json
+import hashlib
+import math
+import asyncio
+import time
+from typing import Literal
 import discord
 from discord.ext import commands
 from discord.utils import get
 from datetime import datetime, timedelta, timezone
-import json
 from dotenv import load_dotenv
 from discord import app_commands, Interaction
+from counter_store import CounterStore
+from storage import Storage
+from log_dispatcher import LogDispatcher, HIGH, LOW
+from join_queue import JoinQueue
+from promotion import TrustedPromoter
+from gateway_profiles import client_options, DEFAULT_PROFILE
+from purge import PurgeFilter, run_purge, parse_time_bound
+from command_core import CommandContext, run_command, command_latency
+import metrics
+from metrics import instrument_event
+from antiflood import FloodDetector
+from activity import ActivityRecorder, USER, CHANNEL, current_hour
+from backfill import BackfillJob
+from reconciler import MemberSweep
+from mass_action import run_mass_action, run_bulk_ban
+from permissions import PermissionResolver, load_config as load_permission_config
 
 # --- Load .env ---
 load_dotenv()
@@ -18,8 +40,9 @@ VERIFIED_ROLE_ID = 801939332004839424
 AUTOROLE_ID = 1405803005235953704
 TRUSTED_ROLE_ID = 811019152533356574
 LOG_CHANNEL_ID = 1414135252380553357
+TRUSTED_MESSAGE_COUNT = int(os.getenv("TRUSTED_MESSAGE_COUNT", "5000"))
 
-# Staff Roles
+# Staff Roles, lowest to highest rank (defaults for TRIAL_MOD_ROLE etc. in .env)
 STAFF_ROLE_IDS = {
     "trial_mod": 1413202670033965097,
     "staff": 802672046659993670,
@@ -29,7 +52,6 @@ STAFF_ROLE_IDS = {
     "chairman": 802671745332412456,
     "founder": 1402031729820172400
 }
-TRIAL_MOD_BAN_EXCLUDED = STAFF_ROLE_IDS["trial_mod"]
 
 # Club/League roles for auto-naming
 ROLE_NAME_MAP = {
@@ -47,300 +69,751 @@ ROLE_NAME_MAP = {
 }
 
 
+# --- Storage & Message Count Tracking ---
+DATABASE_FILE = os.getenv("DATABASE_FILE", "lfc_bot.db")
+MESSAGE_COUNT_FILE = "message_counts.json"  # legacy, imported into the database once
+MESSAGE_COUNT_FLUSH_INTERVAL = float(os.getenv("MESSAGE_COUNT_FLUSH_INTERVAL", "30"))
+storage = Storage(DATABASE_FILE)
+message_counts = CounterStore(storage, flush_interval=MESSAGE_COUNT_FLUSH_INTERVAL)
+activity_history = ActivityRecorder(
+    storage, flush_interval=MESSAGE_COUNT_FLUSH_INTERVAL,
+    hourly_weeks=int(os.getenv("ACTIVITY_HOURLY_WEEKS", "4")),
+    retention_days=int(os.getenv("ACTIVITY_RETENTION_DAYS", "400")),
+)
+# When live counting began; a backfill only counts messages sent before it.
+COUNTING_STARTED_KEY = "counting_started_at"
+
+# --- Metrics ---
+# Prometheus text format on http://METRICS_HOST:METRICS_PORT/metrics (0 disables)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))
+HEARTBEAT_SAMPLE_INTERVAL = 15
+
+
 # --- Bot Setup ---
-intents = discord.Intents.all()
-bot = commands.Bot(command_prefix="+", intents=intents, help_command=None)
+class LFCBot(commands.Bot):
+    async def setup_hook(self):
+        await storage.open()
+        imported = await storage.import_json(MESSAGE_COUNT_FILE)
+        if imported:
+            print(f"📥 Imported message counts for {imported} users from {MESSAGE_COUNT_FILE}")
+        # Legacy counts started at an unknown time, so only a fresh database
+        # records its own start; otherwise /backfill needs an explicit `before`.
+        if (await storage.get_meta(COUNTING_STARTED_KEY) is None
+                and await storage.get_meta("json_imported") is None
+                and not await storage.ranked_users()):
+            await storage.set_meta(COUNTING_STARTED_KEY, datetime.now(timezone.utc).isoformat())
+        if await sync_command_tree():
+            print("🔄 Slash commands changed; synced command tree.")
+        message_counts.start()
+        activity_history.start()
+        log_dispatcher.start()
+        join_queue.start()
+
+        metrics.instrument_http(self.http)
+        metrics.watch_rate_limits()
+        self.metrics_runner = None
+        if METRICS_PORT:
+            self.metrics_runner = await metrics.start_server(METRICS_HOST, METRICS_PORT)
+        self.heartbeat_sampler = asyncio.create_task(self.sample_heartbeat())
+
+    async def sample_heartbeat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_SAMPLE_INTERVAL)
+            if math.isfinite(self.latency):
+                metrics.HEARTBEAT_LATENCY.observe(self.latency)
+                metrics.HEARTBEAT_LAST.set(self.latency)
+
+    async def close(self):
+        self.heartbeat_sampler.cancel()
+        if self.metrics_runner:
+            await self.metrics_runner.cleanup()
+        await backfill_job.cancel()
+        await verification_sweep.close()
+        await join_queue.close()
+        await log_dispatcher.close()
+        await message_counts.close()
+        await activity_history.close()
+        await storage.close()
+        await super().close()
+
+
+# Gateway intents and member caching; see gateway_profiles.py
+INTENTS_PROFILE = os.getenv("INTENTS_PROFILE", DEFAULT_PROFILE)
+CHUNK_GUILDS_AT_STARTUP = os.getenv("CHUNK_GUILDS_AT_STARTUP")
+if CHUNK_GUILDS_AT_STARTUP is not None:
+    CHUNK_GUILDS_AT_STARTUP = CHUNK_GUILDS_AT_STARTUP.lower() in ("1", "true", "yes")
+
+bot = LFCBot(command_prefix="+", help_command=None,
+             **client_options(INTENTS_PROFILE, CHUNK_GUILDS_AT_STARTUP))
 bot.launch_time = datetime.now(timezone.utc)
 
 # --- Logging Helper ---
-async def log_action(member, action, details, color=discord.Color.blue()):
-    log_channel = bot.get_channel(LOG_CHANNEL_ID)
-    if log_channel:
-        embed = discord.Embed(
-            title=action,
-            description=details,
-            color=color,
-            timestamp=datetime.now(timezone.utc)
-        )
-        embed.set_author(name=str(member), icon_url=getattr(member.display_avatar, "url", ""))
-        await log_channel.send(embed=embed)
+# Entries are queued and sent in batches by a background worker, so awaiting
+# log_action never waits on Discord. LOW priority entries are dropped first
+# when the queue overflows (e.g. during a raid).
+log_dispatcher = LogDispatcher(lambda: bot.get_channel(LOG_CHANNEL_ID))
+metrics.registry.register(metrics.Gauge(
+    "lfcbot_log_queue_depth", "Log entries waiting to be sent.", lambda: log_dispatcher.depth))
+metrics.registry.register(metrics.Gauge(
+    "lfcbot_log_flush_latency_seconds", "Queue-to-send time of the last log batch.",
+    lambda: log_dispatcher.last_flush_latency))
 
-# --- Message Count Tracking ---
-MESSAGE_COUNT_FILE = "message_counts.json"
-if os.path.exists(MESSAGE_COUNT_FILE):
-    with open(MESSAGE_COUNT_FILE, "r") as f:
-        message_counts = json.load(f)
-else:
-    message_counts = {}
+async def log_action(member, action, details, color=discord.Color.blue(), priority=HIGH):
+    embed = discord.Embed(
+        title=action,
+        description=details,
+        color=color,
+        timestamp=datetime.now(timezone.utc)
+    )
+    embed.set_author(name=str(member), icon_url=getattr(member.display_avatar, "url", ""))
+    log_dispatcher.enqueue(embed, priority)
 
 # -----------------------------
 # --- Events ---
 # -----------------------------
 @bot.event
 async def on_ready():
-    await bot.tree.sync(guild=discord.Object(id=GUILD_ID))
+    # Fires again after every reconnect; the command tree is synced once in setup_hook.
     print(f"✅ Logged in as {bot.user} (ID: {bot.user.id})")
     await bot.change_presence(activity=discord.Game(name="Protecting the BETTER LFC Discord Server"))
+    verification_sweep.start()
+    # Resume a backfill that was interrupted by a restart.
+    if not backfill_job.running:
+        cutoff = await backfill_job.pending_cutoff()
+        guild = bot.get_guild(GUILD_ID)
+        if cutoff and guild:
+            await backfill_job.start(guild.text_channels, cutoff)
+            print(f"⏪ Resumed message count backfill (before {cutoff.isoformat()})")
+
+# -----------------------------
+# --- Joins & Raid Mode ---
+# -----------------------------
+async def apply_join_roles(member: discord.Member, raid_mode: bool):
+    guild = member.guild
+    roles = [role for role in (guild.get_role(UNVERIFIED_ROLE_ID), guild.get_role(AUTOROLE_ID)) if role]
+    if roles:
+        # atomic=False sends one member edit instead of one request per role.
+        # It rewrites the role list from the cache, which is safe for a
+        # member who has only just joined.
+        await member.add_roles(*roles, atomic=False)
+
+    # In raid mode joins are reported in aggregate by the summary loop.
+    if not raid_mode:
+        await log_action(member, "New Member Joined",
+                         f"{member.mention} joined the server.\nUnverified + Season role applied.",
+                         color=discord.Color.yellow(), priority=LOW)
+
+async def log_join_summary(joins, young_accounts, interval):
+    await log_action(bot.user, "Raid Mode: Joins Summary",
+                     f"{joins} joins in last {round(interval)}s, {young_accounts} accounts < 30 days old.",
+                     color=discord.Color.red())
+
+async def log_raid_mode(enabled):
+    if enabled:
+        await log_action(bot.user, "Raid Mode Enabled",
+                         f"{join_queue.raid_threshold}+ joins within {round(join_queue.raid_window)}s. "
+                         f"Join logs will be summarised until the join rate drops.",
+                         color=discord.Color.red())
+    else:
+        await log_action(bot.user, "Raid Mode Disabled", "Join rate is back to normal.",
+                         color=discord.Color.green())
+
+join_queue = JoinQueue(
+    apply_join_roles, log_join_summary, log_raid_mode,
+    workers=int(os.getenv("JOIN_WORKERS", "4")),
+    raid_threshold=int(os.getenv("RAID_JOIN_THRESHOLD", "10")),
+    raid_window=float(os.getenv("RAID_WINDOW_SECONDS", "10")),
+)
+metrics.registry.register(metrics.Gauge(
+    "lfcbot_join_queue_depth", "Joins waiting for roles to be applied.", lambda: join_queue.depth))
 
 @bot.event
+@instrument_event
 async def on_member_join(member: discord.Member):
-    guild = member.guild
-    unverified_role = guild.get_role(UNVERIFIED_ROLE_ID)
-    autorole = guild.get_role(AUTOROLE_ID)
+    join_queue.submit(member)
+
+# -----------------------------
+# --- Verification ---
+# -----------------------------
+# Member IDs whose next update event was caused by our own verification edit,
+# mapped to when that expectation lapses.
+SELF_EDIT_TTL = 30
+self_edits = {}
+MIN_ACCOUNT_AGE_DAYS = 30
+
+def account_age_days(member: discord.Member):
+    return (datetime.now(timezone.utc) - member.created_at.replace(tzinfo=timezone.utc)).days
+
+MAX_NICK_LENGTH = 32
 
-    if unverified_role:
-        await member.add_roles(unverified_role)
-    if autorole:
-        await member.add_roles(autorole)
+def find_club_role(roles, exclude_ids=()):
+    """The club role a member is named after: the first of their club roles,
+    skipping `exclude_ids` (on_member_update passes the roles they had before)."""
+    return next((role for role in roles if role.id in ROLE_NAME_MAP and role.id not in exclude_ids), None)
 
-    await log_action(member, "New Member Joined",
-                     f"{member.mention} joined the server.\nUnverified + Season role applied.",
-                     color=discord.Color.yellow())
+def club_nickname(member: discord.Member, club_role: discord.Role):
+    return f"{member.name} | {ROLE_NAME_MAP[club_role.id]}"
+
+def plan_verification(member: discord.Member, club_role: discord.Role):
+    """Return the (roles, nick) a member should end up with once verified.
+    nick is None when the club nickname would be longer than Discord allows."""
+    roles = [role for role in member.roles if role.id != UNVERIFIED_ROLE_ID and not role.is_default()]
+    verified_role = member.guild.get_role(VERIFIED_ROLE_ID)
+    if verified_role and verified_role not in roles:
+        roles.append(verified_role)
+    nick = club_nickname(member, club_role)
+    return roles, nick if len(nick) <= MAX_NICK_LENGTH else None
+
+async def verify_member(member: discord.Member, club_role: discord.Role):
+    """Apply verification in a single member edit. Returns the nickname set, or None."""
+    roles, new_nick = plan_verification(member, club_role)
+    self_edits[member.id] = time.monotonic() + SELF_EDIT_TTL
+    try:
+        if new_nick is None:
+            await log_action(member, "Nickname Change Failed",
+                             f"Could not rename {member.mention} to '{club_nickname(member, club_role)}': "
+                             f"longer than {MAX_NICK_LENGTH} characters.",
+                             color=discord.Color.red())
+            await member.edit(roles=roles)
+            return None
+        await member.edit(roles=roles, nick=new_nick)
+        return new_nick
+    except discord.Forbidden:
+        # Usually the nickname (member outranks the bot); still apply the roles.
+        await log_action(member, "Nickname Change Failed",
+                         f"Could not rename {member.mention} to '{new_nick}'.",
+                         color=discord.Color.red())
+        try:
+            await member.edit(roles=roles)
+        except discord.HTTPException:
+            self_edits.pop(member.id, None)
+            raise
+        return None
+    except discord.HTTPException:
+        self_edits.pop(member.id, None)
+        raise
 
 @bot.event
+@instrument_event
 async def on_member_update(before: discord.Member, after: discord.Member):
-    guild = after.guild
-    unverified_role = guild.get_role(UNVERIFIED_ROLE_ID)
-    verified_role = guild.get_role(VERIFIED_ROLE_ID)
-
-    new_roles = [role for role in after.roles if role not in before.roles]
-    for role in new_roles:
-        if role.id in ROLE_NAME_MAP:
-            account_age_days = (datetime.now(timezone.utc) - after.created_at.replace(tzinfo=timezone.utc)).days
-            if account_age_days < 30:
-                await log_action(after, "Verification Skipped",
-                                 f"{after.mention} received {role.name} role but account is only {account_age_days} days old.",
-                                 color=discord.Color.orange())
-                return
-
-            if unverified_role in after.roles:
-                await after.remove_roles(unverified_role)
-            if verified_role not in after.roles:
-                await after.add_roles(verified_role)
-
-            new_nick = f"{after.name} | {ROLE_NAME_MAP[role.id]}"
-            try:
-                await after.edit(nick=new_nick)
-            except discord.Forbidden:
-                await log_action(after, "Nickname Change Failed",
-                                 f"Could not rename {after.mention} to '{new_nick}'.",
-                                 color=discord.Color.red())
-
-            await log_action(after, "Member Verified",
-                             f"{after.mention} verified automatically.\n"
-                             f"Account created: {after.created_at.strftime('%Y-%m-%d %H:%M:%S UTC')} ({account_age_days} days old).\n"
-                             f"Role assigned: {role.name}\nNickname set: {new_nick}",
-                             color=discord.Color.green())
+    expires = self_edits.pop(after.id, None)
+    if before.roles == after.roles:
+        return
+    permissions.invalidate(after.id)
+
+    before_ids = {role.id for role in before.roles}
+    has_trusted = after.get_role(TRUSTED_ROLE_ID) is not None
+    if has_trusted != (TRUSTED_ROLE_ID in before_ids):
+        trusted_promoter.reconcile(after.id, has_trusted)
+
+    if expires is not None and expires > time.monotonic():
+        return
+    if VERIFIED_ROLE_ID in before_ids and UNVERIFIED_ROLE_ID not in before_ids:
+        return
+
+    club_role = find_club_role(after.roles, before_ids)
+    if club_role is None:
+        return
+
+    age_days = account_age_days(after)
+    if age_days < MIN_ACCOUNT_AGE_DAYS:
+        await log_action(after, "Verification Skipped",
+                         f"{after.mention} received {club_role.name} role but account is only {age_days} days old.",
+                         color=discord.Color.orange())
+        return
+
+    new_nick = await verify_member(after, club_role)
+    await log_action(after, "Member Verified",
+                     f"{after.mention} verified automatically.\n"
+                     f"Account created: {after.created_at.strftime('%Y-%m-%d %H:%M:%S UTC')} ({age_days} days old).\n"
+                     f"Role assigned: {club_role.name}\nNickname set: {new_nick}",
+                     color=discord.Color.green(), priority=LOW)
+
+# --- Verification Sweep ---
+# Catches up on role changes missed while the bot was offline or rate
+# limited: club roles added during downtime, accounts that have since become
+# old enough, and nicknames that don't match the member's club.
+async def sweep_members():
+    guild = bot.get_guild(GUILD_ID)
+    if guild is None:
+        return
+    if guild.chunked:
+        for member in list(guild.members):
+            yield member
+    else:
+        async for member in guild.fetch_members(limit=None):
+            yield member
+
+def plan_verification_fix(member: discord.Member):
+    """Return ("verify" | "nickname", club_role) if the member needs fixing, else None."""
+    if member.bot:
+        return None
+    club_role = find_club_role(member.roles)
+    if club_role is None:
+        return None
+    if member.get_role(VERIFIED_ROLE_ID) is None or member.get_role(UNVERIFIED_ROLE_ID) is not None:
+        # The bot can't edit members above it; retrying every sweep won't help.
+        if account_age_days(member) < MIN_ACCOUNT_AGE_DAYS or not permissions.outranks(member.guild.me, member):
+            return None
+        return "verify", club_role
+    # Members with several club roles were named after whichever was added
+    # last; any of them is a correct nickname.
+    if any(member.nick == club_nickname(member, role) for role in member.roles if role.id in ROLE_NAME_MAP):
+        return None
+    _, nick = plan_verification(member, club_role)
+    # Skip renames that can never succeed: a nickname over Discord's length
+    # limit, or a member above the bot.
+    if nick is None or not permissions.outranks(member.guild.me, member):
+        return None
+    return "nickname", club_role
+
+async def apply_verification_fix(member: discord.Member, fix):
+    action, club_role = fix
+    if action == "verify":
+        await verify_member(member, club_role)
+        return "verified"
+    _, nick = plan_verification(member, club_role)
+    await member.edit(nick=nick)
+    return "renamed"
+
+async def log_sweep_report(labels, checked, elapsed):
+    if not labels:
+        return
+    details = (f"Checked {checked:,} members in {int(elapsed // 60)}m {int(elapsed % 60)}s.\n"
+               f"Verified: {labels['verified']:,}\nNicknames fixed: {labels['renamed']:,}")
+    if labels["failed"]:
+        details += f"\nFailed: {labels['failed']:,}"
+    await log_action(bot.user, "Verification Sweep", details,
+                     color=discord.Color.orange() if labels["failed"] else discord.Color.green())
+
+verification_sweep = MemberSweep(
+    sweep_members, plan_verification_fix, apply_verification_fix, log_sweep_report,
+    interval=float(os.getenv("VERIFICATION_SWEEP_HOURS", "6")) * 3600,
+    concurrency=int(os.getenv("VERIFICATION_SWEEP_CONCURRENCY", "2")),
+)
+
+# -----------------------------
+# --- Trusted Promotion ---
+# -----------------------------
+trusted_promoter = TrustedPromoter(TRUSTED_MESSAGE_COUNT)
+
+async def promote_trusted(member: discord.Member, count: int, log=True):
+    """Grant the Trusted role. Returns True if it was granted now."""
+    # First time this session we see them over the threshold: they may
+    # already hold the role from an earlier run or a manual grant.
+    if member.get_role(TRUSTED_ROLE_ID) is not None:
+        trusted_promoter.reconcile(member.id, True)
+        return False
+    trusted_role = member.guild.get_role(TRUSTED_ROLE_ID)
+    if not trusted_role or not trusted_promoter.claim(member.id):
+        return False
+    try:
+        await member.add_roles(trusted_role)
+    except discord.HTTPException:
+        trusted_promoter.discard(member.id)
+        raise
+    await storage.record_trusted_grant(member.id)
+    if log:
+        await log_action(member, "Trusted Role Granted",
+                         f"{member.mention} has been granted the Trusted role for sending {count} messages!",
+                         color=discord.Color.green())
+    return True
+
+# -----------------------------
+# --- Message Count Backfill ---
+# -----------------------------
+BACKFILL_CONCURRENCY = int(os.getenv("BACKFILL_CONCURRENCY", "3"))
+
+async def on_backfill_complete(merged):
+    guild = bot.get_guild(GUILD_ID)
+    await message_counts.flush()
+    eligible = [(user_id, count) for user_id, count in await storage.counts_at_least(TRUSTED_MESSAGE_COUNT, merged)
+                if user_id not in trusted_promoter.promoted]
+    semaphore = asyncio.Semaphore(BACKFILL_CONCURRENCY)
+
+    async def promote(user_id, count):
+        async with semaphore:
+            member = guild.get_member(user_id)
+            if member is None:
+                try:
+                    member = await guild.fetch_member(user_id)
+                except discord.NotFound:
+                    return False
+            return await promote_trusted(member, count, log=False)
+
+    results = await asyncio.gather(*(promote(user_id, count) for user_id, count in eligible), return_exceptions=True)
+    promoted = [user_id for (user_id, _), result in zip(eligible, results) if result is True]
+    failed = sum(1 for result in results if isinstance(result, Exception))
+    details = (f"Added {sum(merged.values()):,} historical messages for {len(merged):,} members.\n"
+               f"Granted the Trusted role to {len(promoted):,} members.")
+    if failed:
+        details += f" {failed} could not be promoted."
+    if promoted:
+        mentions = " ".join(f"<@{user_id}>" for user_id in promoted[:50])
+        details += f"\n{mentions}" + (f" and {len(promoted) - 50} more" if len(promoted) > 50 else "")
+    await log_action(guild.me, "Message Count Backfill Complete", details, color=discord.Color.green())
+
+backfill_job = BackfillJob(storage, message_counts, on_backfill_complete, concurrency=BACKFILL_CONCURRENCY)
+
+# -----------------------------
+# --- Anti-Flood ---
+# -----------------------------
+FLOOD_TIMEOUT = timedelta(minutes=int(os.getenv("FLOOD_TIMEOUT_MINUTES", "10")))
+FLOOD_SLOWMODE_SECONDS = int(os.getenv("FLOOD_SLOWMODE_SECONDS", "5"))
+FLOOD_SLOWMODE_DURATION = int(os.getenv("FLOOD_SLOWMODE_DURATION", "300"))
+flood_detector = FloodDetector(
+    user_rate=int(os.getenv("FLOOD_USER_MESSAGES", "8")),
+    user_window=float(os.getenv("FLOOD_USER_WINDOW", "5")),
+    duplicate_count=int(os.getenv("FLOOD_DUPLICATES", "4")),
+    mention_limit=int(os.getenv("FLOOD_MENTIONS", "6")),
+    channel_rate=int(os.getenv("FLOOD_CHANNEL_MESSAGES", "40")),
+    channel_window=float(os.getenv("FLOOD_CHANNEL_WINDOW", "10")),
+)
+FLOOD_REASONS = {"rate": "message flood", "duplicate": "repeated messages", "mentions": "mass mentions"}
+
+background_tasks = set()
+
+def spawn(coro):
+    """Run a coroutine without blocking the caller, keeping a reference until it finishes."""
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+async def handle_flood(member: discord.Member, verdict):
+    reason = f"Auto-moderation: {FLOOD_REASONS[verdict.reason]}"
+    by_channel = {}
+    for channel_id, message_id in verdict.recent_messages:
+        by_channel.setdefault(channel_id, []).append(discord.Object(id=message_id))
+    deleted = 0
+    for channel_id, messages in by_channel.items():
+        channel = bot.get_channel(channel_id)
+        if channel is None:
+            continue
+        try:
+            await channel.delete_messages(messages, reason=reason)
+            deleted += len(messages)
+        except discord.HTTPException:
+            pass
+
+    timed_out = True
+    try:
+        await apply_timeout(member, FLOOD_TIMEOUT, reason)
+    except discord.HTTPException:
+        timed_out = False
+    await log_action(member, "Auto-Moderation",
+                     f"{member.mention} flagged for {FLOOD_REASONS[verdict.reason]}.\n"
+                     f"Deleted {deleted} recent messages."
+                     + (f" Timed out for {FLOOD_TIMEOUT}." if timed_out else " Timeout failed."),
+                     color=discord.Color.orange())
+
+async def handle_channel_flood(channel):
+    previous = channel.slowmode_delay
+    if previous >= FLOOD_SLOWMODE_SECONDS:
+        return
+    try:
+        await set_slowmode(channel, FLOOD_SLOWMODE_SECONDS, "Auto-moderation: channel flood")
+    except discord.HTTPException:
+        return
+    await log_action(bot.user, "Auto Slowmode",
+                     f"{channel.mention} set to {FLOOD_SLOWMODE_SECONDS}s slowmode for "
+                     f"{FLOOD_SLOWMODE_DURATION // 60} minutes after a message flood.",
+                     color=discord.Color.orange())
+    await asyncio.sleep(FLOOD_SLOWMODE_DURATION)
+    try:
+        await set_slowmode(channel, previous, "Auto-moderation: flood over")
+    except discord.HTTPException:
+        pass
 
 @bot.event
+@instrument_event
 async def on_message(message: discord.Message):
     if message.author.bot:
         return
 
-    # Increment message count
-    user_id = str(message.author.id)
-    message_counts[user_id] = message_counts.get(user_id, 0) + 1
-    with open(MESSAGE_COUNT_FILE, "w") as f:
-        json.dump(message_counts, f)
+    if message.guild:
+        if flood_detector.check_channel(message.channel.id):
+            spawn(handle_channel_flood(message.channel))
+        verdict = flood_detector.check(message.author.id, message.channel.id, message.id, message.content,
+                                       len(message.mentions) + len(message.role_mentions))
+        # Flagged messages don't count towards Trusted and can't run commands.
+        if verdict and not is_staff(message.author):
+            if verdict.new:
+                spawn(handle_flood(message.author, verdict))
+            return
+
+    # Increment message count and activity history (flushed to disk in the background)
+    count = await message_counts.incr(message.author.id)
+    if message.guild:
+        activity_history.record(message.author.id, message.channel.id)
 
-    # Trusted Role at 5000 messages
-    if message_counts[user_id] >= 5000:
-        trusted_role = message.guild.get_role(TRUSTED_ROLE_ID)
-        if trusted_role and trusted_role not in message.author.roles:
-            await message.author.add_roles(trusted_role)
-            await log_action(message.author, "Trusted Role Granted",
-                             f"{message.author.mention} has been granted the Trusted role for sending {message_counts[user_id]} messages!",
-                             color=discord.Color.green())
+    # Trusted Role once the threshold is crossed
+    if trusted_promoter.needs_check(message.author.id, count) and message.guild:
+        await promote_trusted(message.author, count)
 
     await bot.process_commands(message)
 
 # -----------------------------
-# --- Helper Check for Staff ---
+# --- Permissions ---
 # -----------------------------
-def is_staff(member: discord.Member):
-    return any(role.id in STAFF_ROLE_IDS.values() for role in member.roles)
-
-def can_ban(member: discord.Member):
-    return is_staff(member) and TRIAL_MOD_BAN_EXCLUDED not in [role.id for role in member.roles]
-
-
-# Slash Help
-@bot.tree.command(name="help", description="Show all commands & info", guild=discord.Object(id=GUILD_ID))
-async def help_slash(interaction: Interaction):
-    embed = discord.Embed(
-        title="LFC Bot Commands & Info",
-        color=discord.Color.green(),
-        description="Here’s a guide to all the bot commands and features!"
-    )
+# Staff rank and capabilities per member, cached until their roles change;
+# see permissions.py. /reloadperms picks up .env changes without a restart.
+permissions = PermissionResolver(load_permission_config(defaults=STAFF_ROLE_IDS))
 
-    embed.add_field(
-        name="🛡️ Moderation Commands",
-        value=(
-            "/kick @user [reason] — Kick a user from the server (Staff only)\n"
-            "/ban @user [reason] — Ban a user (Staff only; Trial Mod cannot ban)\n"
-            "/timeout @user [duration] [reason] — Timeout a user (Staff only)\n"
-            "/purge [number] — Delete messages in a channel (Staff only)\n"
-            "/lock — Lock the current channel (Staff only)\n"
-            "/unlock — Unlock the current channel (Staff only)"
-        ),
-        inline=False
-    )
+def is_staff(member: discord.Member):
+    return permissions.is_staff(member)
 
-    embed.add_field(
-        name="📝 Utility Commands",
-        value=(
-            "/say [message] — Make the bot say something (Staff only)\n"
-            "/embed [title] | [description] — Create an embed message (Staff only)\n"
-            "/help — Show this commands list"
-        ),
-        inline=False
-    )
+@bot.event
+async def on_guild_role_update(before: discord.Role, after: discord.Role):
+    # Position changes affect every member's top role.
+    permissions.clear()
 
-    embed.add_field(
-        name="👑 Roles & Verification",
-        value=(
-            "• Verified Role: Automatically given to accounts older than 30 days when they choose a club/league.\n"
-            "• Unverified Role: Removed automatically when Verified role is assigned.\n"
-            "• Auto Roles: Everyone gets the 25/26 season role on join.\n"
-            "• Club/League Roles: Assigned automatically from prejoin questions (PL, Ligue 1, Serie A, etc.) and auto-naming updates nickname to Name | Club/League.\n"
-            "• Trusted Role: Granted after sending 5000 messages.\n"
-            "• Account Age Check: Only accounts older than 30 days are auto-verified; younger accounts remain unverified until manually checked."
-        ),
-        inline=False
-    )
+@bot.event
+async def on_guild_role_create(role: discord.Role):
+    permissions.clear()
 
-    embed.add_field(
-        name="📜 Logging",
-        value=(
-            "• Bot logs all moderation actions (kick, ban, timeout, purge, lock/unlock) to the designated log channel.\n"
-            "• Also logs auto-verification, nickname changes, and role assignments.\n"
-            "• Verified logs include account creation date and age for staff to manually verify."
-        ),
-        inline=False
-    )
+@bot.event
+async def on_guild_role_delete(role: discord.Role):
+    permissions.clear()
 
-    await interaction.response.send_message(embed=embed, ephemeral=True)
 
 # -----------------------------
-# --- Slash Commands ---
+# --- Command Core ---
 # -----------------------------
-@bot.tree.command(name="ping", description="Check bot latency & uptime", guild=discord.Object(id=GUILD_ID))
-async def ping_slash(interaction: Interaction):
+# Each command is implemented once here and called by both the slash and the
+# prefix front-end through a CommandContext. Permission checks answer right
+# away; anything that waits on Discord defers the interaction first, and the
+# log entry is sent alongside the reply.
+NO_PERMISSION = "❌ You do not have permission."
+
+def parse_duration(duration: str):
+    unit = duration[-1:].lower()
+    try:
+        amount = int(duration[:-1])
+    except ValueError:
+        raise ValueError("❌ Invalid duration format! Use e.g., 30s, 5m, 2h, 7d.")
+    delta = {"s": timedelta(seconds=amount),
+             "m": timedelta(minutes=amount),
+             "h": timedelta(hours=amount),
+             "d": timedelta(days=amount)}.get(unit)
+    if not delta:
+        raise ValueError("❌ Invalid duration unit! Use s, m, h, or d.")
+    return delta
+
+def ping_text():
     latency = round(bot.latency * 1000)
     uptime = datetime.now(timezone.utc) - bot.launch_time
     days = uptime.days
     hours, remainder = divmod(uptime.seconds, 3600)
     minutes, seconds = divmod(remainder, 60)
-    await interaction.response.send_message(
-        f"Pong! 🏓\nLatency: `{latency}ms`\nUptime: `{days}d {hours}h {minutes}m {seconds}s`"
-    )
+    return (f"Pong! 🏓\nLatency: `{latency}ms`\nUptime: `{days}d {hours}h {minutes}m {seconds}s`\n"
+            f"Log queue: `{log_dispatcher.depth}` (last flush `{round(log_dispatcher.last_flush_latency * 1000)}ms`)")
 
-@bot.tree.command(name="kick", description="Kick a user", guild=discord.Object(id=GUILD_ID))
-async def kick_slash(interaction: Interaction, member: discord.Member, reason: str = None):
-    if not is_staff(interaction.user):
-        await interaction.response.send_message("❌ You do not have permission.", ephemeral=True)
+async def ping_core(cmd: CommandContext):
+    await cmd.reply(ping_text())
+
+async def kick_core(cmd: CommandContext, member: discord.Member, reason: str):
+    if not permissions.can(cmd.actor, "kick"):
+        await cmd.reply(NO_PERMISSION, ephemeral=True)
         return
-    if member.top_role >= interaction.user.top_role:
-        await interaction.response.send_message("❌ Cannot kick someone with equal/higher role.", ephemeral=True)
+    if not permissions.outranks(cmd.actor, member):
+        await cmd.reply("❌ Cannot kick someone with equal/higher role.", ephemeral=True)
         return
+    await cmd.defer()
     await member.kick(reason=reason)
-    await log_action(member, "Kick", f"{interaction.user.mention} kicked {member.mention}\nReason: {reason}", color=discord.Color.orange())
-    await interaction.response.send_message(f"{member.mention} has been kicked.")
+    case_id = await storage.add_case("Kick", cmd.actor.id, member.id, reason)
+    await asyncio.gather(
+        cmd.reply(f"{member.mention} has been kicked. (Case #{case_id})"),
+        log_action(member, f"Kick | Case #{case_id}", f"{cmd.actor.mention} kicked {member.mention}\nReason: {reason}", color=discord.Color.orange()),
+    )
 
-@bot.tree.command(name="ban", description="Ban a user", guild=discord.Object(id=GUILD_ID))
-async def ban_slash(interaction: Interaction, member: discord.Member, reason: str = None):
-    if not can_ban(interaction.user):
-        await interaction.response.send_message("❌ You cannot use the ban command.", ephemeral=True)
+async def ban_core(cmd: CommandContext, member: discord.Member, reason: str):
+    if not permissions.can(cmd.actor, "ban"):
+        await cmd.reply("❌ You cannot use the ban command.", ephemeral=True)
         return
-    if member.top_role >= interaction.user.top_role:
-        await interaction.response.send_message("❌ Cannot ban someone with equal/higher role.", ephemeral=True)
+    if not permissions.outranks(cmd.actor, member):
+        await cmd.reply("❌ Cannot ban someone with equal/higher role.", ephemeral=True)
         return
+    await cmd.defer()
     await member.ban(reason=reason)
-    await log_action(member, "Ban", f"{interaction.user.mention} banned {member.mention}\nReason: {reason}", color=discord.Color.red())
-    await interaction.response.send_message(f"{member.mention} has been banned.")
+    case_id = await storage.add_case("Ban", cmd.actor.id, member.id, reason)
+    await asyncio.gather(
+        cmd.reply(f"{member.mention} has been banned. (Case #{case_id})"),
+        log_action(member, f"Ban | Case #{case_id}", f"{cmd.actor.mention} banned {member.mention}\nReason: {reason}", color=discord.Color.red()),
+    )
 
-@bot.tree.command(name="timeout", description="Timeout a user", guild=discord.Object(id=GUILD_ID))
-async def timeout_slash(interaction: Interaction, member: discord.Member, duration: str, reason: str = None):
-    if not is_staff(interaction.user):
-        await interaction.response.send_message("❌ You do not have permission.", ephemeral=True)
+async def apply_timeout(member: discord.Member, delta: timedelta, reason: str):
+    await member.edit(timed_out_until=datetime.now(timezone.utc) + delta, reason=reason)
+
+async def set_slowmode(channel, seconds: int, reason: str = None):
+    await channel.edit(slowmode_delay=seconds, reason=reason)
+
+async def timeout_core(cmd: CommandContext, member: discord.Member, duration: str, reason: str):
+    if not permissions.can(cmd.actor, "timeout"):
+        await cmd.reply(NO_PERMISSION, ephemeral=True)
         return
-    if interaction.user.id == member.id:
-        await interaction.response.send_message("❌ You can't timeout yourself!", ephemeral=True)
+    if cmd.actor.id == member.id:
+        await cmd.reply("❌ You can't timeout yourself!", ephemeral=True)
         return
-
-    unit = duration[-1].lower()
     try:
-        amount = int(duration[:-1])
-    except ValueError:
-        await interaction.response.send_message("❌ Invalid duration format!", ephemeral=True)
+        delta = parse_duration(duration)
+    except ValueError as e:
+        await cmd.reply(str(e), ephemeral=True)
         return
 
-    delta = {"s": timedelta(seconds=amount),
-             "m": timedelta(minutes=amount),
-             "h": timedelta(hours=amount),
-             "d": timedelta(days=amount)}.get(unit)
+    await cmd.defer()
+    await apply_timeout(member, delta, reason)
+    case_id = await storage.add_case("Timeout", cmd.actor.id, member.id, reason, duration=int(delta.total_seconds()))
+    await asyncio.gather(
+        cmd.reply(f"{member.mention} has been timed out for {duration}. Reason: {reason} (Case #{case_id})"),
+        log_action(member, f"Timeout | Case #{case_id}", f"{cmd.actor.mention} timed out {member.mention} for {duration}. Reason: {reason}", color=discord.Color.orange()),
+    )
 
-    if not delta:
-        await interaction.response.send_message("❌ Invalid duration unit! Use s, m, h, or d.", ephemeral=True)
-        return
+class PurgeFlags(commands.FlagConverter):
+    user: discord.Member = None
+    bots: bool = False
+    contains: str = None
+    attachments: bool = False
+    since: str = None
+    until: str = None
 
-    until_time = datetime.now(timezone.utc) + delta
-    await member.edit(timed_out_until=until_time, reason=reason)
-    await log_action(member, "Timeout", f"{interaction.user.mention} timed out {member.mention} for {duration}. Reason: {reason}", color=discord.Color.orange())
-    await interaction.response.send_message(f"{member.mention} has been timed out for {duration}. Reason: {reason}")
+def build_purge_filter(user, bots, contains, attachments, since, until):
+    try:
+        return PurgeFilter(
+            author_id=user.id if user else None,
+            bots_only=bots,
+            pattern=contains,
+            attachments_only=attachments,
+            since=parse_time_bound(since) if since else None,
+            until=parse_time_bound(until) if until else None,
+        )
+    except re.error as e:
+        raise ValueError(f"Invalid regex: {e}")
 
-@bot.tree.command(name="purge", description="Delete messages", guild=discord.Object(id=GUILD_ID))
-async def purge_slash(interaction: Interaction, amount: int):
-    if not is_staff(interaction.user):
-        await interaction.response.send_message("❌ You do not have permission.", ephemeral=True)
-        return
-    deleted = await interaction.channel.purge(limit=amount)
-    await log_action(interaction.user, "Purge", f"{interaction.user.mention} deleted {len(deleted)} messages in {interaction.channel.mention}")
-    await interaction.response.send_message(f"✅ Deleted {len(deleted)} messages.", ephemeral=True)
+def purge_summary(result):
+    summary = f"✅ Deleted {result.deleted} messages (searched {result.scanned})."
+    if result.failed:
+        summary += f" {result.failed} could not be deleted."
+    return summary
 
-@bot.tree.command(name="lock", description="Lock channel", guild=discord.Object(id=GUILD_ID))
-async def lock_slash(interaction: Interaction):
-    if not is_staff(interaction.user):
-        await interaction.response.send_message("❌ You do not have permission.", ephemeral=True)
+async def purge_core(cmd: CommandContext, amount: int, user=None, bots=False, contains=None,
+                     attachments=False, since=None, until=None):
+    if not permissions.can(cmd.actor, "purge"):
+        await cmd.reply(NO_PERMISSION, ephemeral=True)
+        return
+    try:
+        purge_filter = build_purge_filter(user, bots, contains, attachments, since, until)
+    except ValueError as e:
+        await cmd.reply(f"❌ {e}", ephemeral=True)
         return
-    await interaction.channel.set_permissions(interaction.guild.default_role, send_messages=False)
-    await log_action(interaction.user, "Channel Locked", f"{interaction.user.mention} locked {interaction.channel.mention}")
-    await interaction.response.send_message(f"{interaction.channel.mention} is now locked.")
 
-@bot.tree.command(name="unlock", description="Unlock channel", guild=discord.Object(id=GUILD_ID))
-async def unlock_slash(interaction: Interaction):
-    if not is_staff(interaction.user):
-        await interaction.response.send_message("❌ You do not have permission.", ephemeral=True)
+    await cmd.defer(ephemeral=True)
+    skip_ids = set()
+    if not cmd.is_slash:
+        skip_ids.add((await cmd.reply("🧹 Purging…")).id)
+
+    async def progress(result):
+        await cmd.update(f"🧹 Purging… searched {result.scanned}/{amount}, deleted {result.deleted}.")
+
+    result = await run_purge(cmd.channel, amount, purge_filter, progress, skip_ids=skip_ids)
+    details = f"{cmd.actor.mention} deleted {result.deleted} messages in {cmd.channel.mention}"
+    if purge_filter.describe():
+        details += f"\nFilter: {purge_filter.describe()}"
+    case_id = await storage.add_case("Purge", cmd.actor.id, user.id if user else None, channel_id=cmd.channel.id,
+                                     details=f"Deleted {result.deleted} of {result.scanned} searched. {purge_filter.describe() or ''}".strip())
+    await asyncio.gather(
+        cmd.update(purge_summary(result), delete_after=5),
+        log_action(cmd.actor, f"Purge | Case #{case_id}", details),
+    )
+
+async def set_lock_core(cmd: CommandContext, locked: bool):
+    if not is_staff(cmd.actor):
+        await cmd.reply(NO_PERMISSION, ephemeral=True)
         return
-    await interaction.channel.set_permissions(interaction.guild.default_role, send_messages=True)
-    await log_action(interaction.user, "Channel Unlocked", f"{interaction.user.mention} unlocked {interaction.channel.mention}")
-    await interaction.response.send_message(f"{interaction.channel.mention} is now unlocked.")
+    await cmd.defer()
+    await cmd.channel.set_permissions(cmd.guild.default_role, send_messages=not locked)
+    action, verb = ("Channel Locked", "locked") if locked else ("Channel Unlocked", "unlocked")
+    await asyncio.gather(
+        cmd.reply(f"{cmd.channel.mention} is now {verb}."),
+        log_action(cmd.actor, action, f"{cmd.actor.mention} {verb} {cmd.channel.mention}"),
+    )
 
-@bot.tree.command(name="say", description="Bot says a message", guild=discord.Object(id=GUILD_ID))
-async def say_slash(interaction: Interaction, message: str):
-    if not is_staff(interaction.user):
-        await interaction.response.send_message("❌ You do not have permission.", ephemeral=True)
+async def lock_core(cmd: CommandContext):
+    await set_lock_core(cmd, True)
+
+async def unlock_core(cmd: CommandContext):
+    await set_lock_core(cmd, False)
+
+async def say_core(cmd: CommandContext, message: str):
+    if not permissions.can(cmd.actor, "say"):
+        await cmd.reply(NO_PERMISSION, ephemeral=True)
         return
-    await interaction.channel.send(message)
-    await log_action(interaction.user, "Say", f"{interaction.user.mention} used /say: {message}")
-    await interaction.response.send_message("✅ Message sent.", ephemeral=True)
+    await cmd.defer(ephemeral=True)
+    await cmd.channel.send(message)
+    replies = [log_action(cmd.actor, "Say", f"{cmd.actor.mention} used {cmd.prefix}say: {message}")]
+    if cmd.is_slash:
+        replies.append(cmd.reply("✅ Message sent.", ephemeral=True))
+    await asyncio.gather(*replies)
 
-@bot.tree.command(name="embed", description="Create an embed", guild=discord.Object(id=GUILD_ID))
-async def embed_slash(interaction: Interaction, title: str, description: str):
-    if not is_staff(interaction.user):
-        await interaction.response.send_message("❌ You do not have permission.", ephemeral=True)
+async def embed_core(cmd: CommandContext, title: str, description: str):
+    if not permissions.can(cmd.actor, "say"):
+        await cmd.reply(NO_PERMISSION, ephemeral=True)
         return
+    await cmd.defer(ephemeral=True)
     embed = discord.Embed(title=title, description=description, color=discord.Color.blue())
-    await interaction.channel.send(embed=embed)
-    await log_action(interaction.user, "Embed", f"{interaction.user.mention} sent an embed titled '{title}'")
-    await interaction.response.send_message("✅ Embed sent.", ephemeral=True)
+    await cmd.channel.send(embed=embed)
+    replies = [log_action(cmd.actor, "Embed", f"{cmd.actor.mention} sent an embed titled '{title}'")]
+    if cmd.is_slash:
+        replies.append(cmd.reply("✅ Embed sent.", ephemeral=True))
+    await asyncio.gather(*replies)
+
+def format_ms(seconds):
+    if seconds is None:
+        return "–"
+    return "∞" if math.isinf(seconds) else f"{seconds * 1000:.0f}ms"
+
+async def stats_core(cmd: CommandContext):
+    if not is_staff(cmd.actor):
+        await cmd.reply(NO_PERMISSION, ephemeral=True)
+        return
+    embed = discord.Embed(title="Bot Stats", color=discord.Color.blue(), timestamp=datetime.now(timezone.utc))
+
+    handlers = [f"`{event}`: {metrics.EVENT_LATENCY.count(event)} events, "
+                f"p50 ≤{format_ms(metrics.EVENT_LATENCY.quantile(0.5, event))}, "
+                f"p99 ≤{format_ms(metrics.EVENT_LATENCY.quantile(0.99, event))}"
+                for (event,) in sorted(metrics.EVENT_LATENCY.series)]
+    embed.add_field(name="Event Handlers", value="\n".join(handlers) or "No events yet.", inline=False)
+
+    commands_run = [f"`{cmd.prefix}{name}`: {count} calls, p50 {format_ms(p50)}, p99 {format_ms(p99)}"
+                    for name, count, p50, p99 in command_latency.summary()]
+    embed.add_field(name="Commands", value="\n".join(commands_run) or "No commands yet.", inline=False)
+
+    embed.add_field(name="REST", value=f"{metrics.REST_REQUESTS.total()} requests\n"
+                                       f"{metrics.REST_RATE_LIMITS.total()} rate limited (429)")
+    embed.add_field(name="Gateway", value=f"Heartbeat {format_ms(bot.latency)}\n"
+                                          f"p99 ≤{format_ms(metrics.HEARTBEAT_LATENCY.quantile(0.99))}")
+    embed.add_field(name="Queues", value=f"Log: {log_dispatcher.depth} "
+                                         f"(last flush {format_ms(log_dispatcher.last_flush_latency)})\n"
+                                         f"Joins: {join_queue.depth}")
+    embed.add_field(name="Memory", value=f"{metrics.process_rss_bytes() / (1024 * 1024):.0f} MB RSS")
+    await cmd.reply(embed=embed, ephemeral=True)
+
 
 # -----------------------------
-# --- Help Commands ---
+# --- Help ---
 # -----------------------------
-# Prefix Help
-@bot.command(name="help")
-async def help_prefix(ctx):
+MASS_USAGE = {
+    "/": "/massban|masskick [ids] [joined] [age] [reason], /masstimeout [duration] …",
+    "+": "+massban|masskick [ids: 1 2 3] [joined: minutes] [age: days] [reason: …], +masstimeout [duration] …",
+}
+
+PURGE_USAGE = {
+    "/": "/purge [number] [user] [bots] [contains] [attachments] [since] [until]",
+    "+": "+purge [number] [user: @user] [bots: yes] [contains: regex] [attachments: yes] [since: 2h] [until: 1d]",
+}
+
+def build_help_embed(prefix):
     embed = discord.Embed(
         title="LFC Bot Commands & Info",
         color=discord.Color.green(),
@@ -351,12 +824,16 @@ async def help_prefix(ctx):
     embed.add_field(
         name="🛡️ Moderation Commands",
         value=(
-            "+kick @user [reason] — Kick a user from the server (Staff only)\n"
-            "+ban @user [reason] — Ban a user (Staff only; Trial Mod cannot ban)\n"
-            "+timeout @user [duration] [reason] — Timeout a user (Staff only)\n"
-            "+purge [number] — Delete messages in a channel (Staff only)\n"
-            "+lock — Lock the current channel (Staff only)\n"
-            "+unlock — Unlock the current channel (Staff only)"
+            f"{prefix}kick @user [reason] — Kick a user from the server (Staff only)\n"
+            f"{prefix}ban @user [reason] — Ban a user (Staff and above; not Trial Mods)\n"
+            f"{prefix}timeout @user [duration] [reason] — Timeout a user (Staff only)\n"
+            f"{PURGE_USAGE[prefix]} — Delete messages in a channel (Staff only)\n"
+            f"{prefix}lock — Lock the current channel (Staff only)\n"
+            f"{prefix}unlock — Unlock the current channel (Staff only)\n"
+            f"{MASS_USAGE[prefix]} — Act on many members at once (Staff only)\n"
+            f"{prefix}cases @user [page] — A user's moderation history (Staff only)\n"
+            f"{prefix}case [id] — Show one moderation case (Staff only)\n"
+            f"{prefix}reason [id] [reason] — Change a case's reason (Staff only)"
         ),
         inline=False
     )
@@ -365,9 +842,16 @@ async def help_prefix(ctx):
     embed.add_field(
         name="📝 Utility Commands",
         value=(
-            "+say [message] — Make the bot say something (Staff only)\n"
-            "+embed [title] | [description] — Create an embed message (Staff only)\n"
-            "+help — Show this commands list"
+            f"{prefix}say [message] — Make the bot say something (Staff only)\n"
+            f"{prefix}embed [title] | [description] — Create an embed message (Staff only)\n"
+            f"{prefix}leaderboard [page] — Top message senders\n"
+            f"{prefix}rank [@user] — Show a member's message rank\n"
+            f"{prefix}activity [@user] [#channel] — Rolling 7/30-day activity\n"
+            f"{prefix}stats — Handler, command, REST and memory stats (Staff only)\n"
+            f"{prefix}sync — Force a slash command sync (Staff only)\n"
+            f"{prefix}backfill start|status|cancel [before] — Count historical messages (Staff only)\n"
+            f"{prefix}reloadperms — Reload staff roles from .env (Staff only)\n"
+            f"{prefix}help — Show this commands list"
         ),
         inline=False
     )
@@ -380,7 +864,7 @@ async def help_prefix(ctx):
             "• Unverified Role: Removed automatically when Verified role is assigned.\n"
             "• Auto Roles: Everyone gets the 25/26 season role on join.\n"
             "• Club/League Roles: Assigned automatically from prejoin questions (PL, Ligue 1, Serie A, etc.) and auto-naming updates nickname to Name | Club/League.\n"
-            "• Trusted Role: Granted after sending 5000 messages.\n"
+            f"• Trusted Role: Granted after sending {TRUSTED_MESSAGE_COUNT} messages.\n"
             "• Account Age Check: Only accounts older than 30 days are auto-verified; younger accounts remain unverified until manually checked."
         ),
         inline=False
@@ -392,125 +876,655 @@ async def help_prefix(ctx):
         value=(
             "• Bot logs all moderation actions (kick, ban, timeout, purge, lock/unlock) to the designated log channel.\n"
             "• Also logs auto-verification, nickname changes, and role assignments.\n"
+            "• Flooding, repeated messages and mass mentions are auto-deleted and timed out; flooded channels get a temporary slowmode.\n"
             "• Verified logs include account creation date and age for staff to manually verify."
         ),
         inline=False
     )
 
-    embed.set_footer(text="Use slash commands with / as well!")
-    await ctx.send(embed=embed)
+    if prefix == "+":
+        embed.set_footer(text="Use slash commands with / as well!")
+    return embed
+
+# The help text is static, so both embeds are built once at startup.
+HELP_EMBEDS = {prefix: build_help_embed(prefix) for prefix in ("/", "+")}
+
+async def help_core(cmd: CommandContext):
+    await cmd.reply(embed=HELP_EMBEDS[cmd.prefix], ephemeral=True)
 
 # -----------------------------
-# --- Prefix Commands ---
+# --- Command Tree Sync ---
 # -----------------------------
-@bot.command(name="ping")
-async def ping_prefix(ctx):
-    latency = round(bot.latency * 1000)
-    uptime = datetime.now(timezone.utc) - bot.launch_time
-    days = uptime.days
-    hours, remainder = divmod(uptime.seconds, 3600)
-    minutes, seconds = divmod(remainder, 60)
-    await ctx.send(f"Pong! 🏓\nLatency: `{latency}ms`\nUptime: `{days}d {hours}h {minutes}m {seconds}s`")
+# Syncing re-uploads every command and is rate limited, so it only happens
+# when the command definitions' fingerprint differs from the last synced one.
+COMMAND_TREE_HASH_KEY = "command_tree_hash"
 
-@bot.command(name="kick")
-async def kick_prefix(ctx, member: discord.Member, *, reason: str = None):
-    if not is_staff(ctx.author):
-        await ctx.send("❌ You do not have permission.")
+def command_tree_fingerprint():
+    payload = []
+    for command in bot.tree.get_commands(guild=discord.Object(id=GUILD_ID)):
+        try:
+            payload.append(command.to_dict(bot.tree))
+        except TypeError:  # discord.py < 2.4
+            payload.append(command.to_dict())
+    payload.sort(key=lambda command: (command.get("type", 1), command["name"]))
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+async def sync_command_tree(force=False):
+    """Sync the guild's slash commands if they changed. Returns True if a sync happened."""
+    fingerprint = command_tree_fingerprint()
+    if not force and await storage.get_meta(COMMAND_TREE_HASH_KEY) == fingerprint:
+        return False
+    await bot.tree.sync(guild=discord.Object(id=GUILD_ID))
+    await storage.set_meta(COMMAND_TREE_HASH_KEY, fingerprint)
+    return True
+
+async def sync_core(cmd: CommandContext):
+    if not is_staff(cmd.actor):
+        await cmd.reply(NO_PERMISSION, ephemeral=True)
+        return
+    await cmd.defer(ephemeral=True)
+    await sync_command_tree(force=True)
+    await asyncio.gather(
+        cmd.reply("✅ Slash commands synced.", ephemeral=True),
+        log_action(cmd.actor, "Command Sync", f"{cmd.actor.mention} forced a slash command sync."),
+    )
+
+async def reload_permissions_core(cmd: CommandContext):
+    if not is_staff(cmd.actor):
+        await cmd.reply(NO_PERMISSION, ephemeral=True)
         return
-    if member.top_role >= ctx.author.top_role:
-        await ctx.send("❌ Cannot kick someone with equal/higher role.")
+    load_dotenv(override=True)
+    try:
+        config = load_permission_config(defaults=STAFF_ROLE_IDS)
+    except ValueError as e:
+        await cmd.reply(f"❌ {e}", ephemeral=True)
         return
-    await member.kick(reason=reason)
-    await log_action(member, "Kick", f"{ctx.author.mention} kicked {member.mention}\nReason: {reason}", color=discord.Color.orange())
-    await ctx.send(f"{member.mention} has been kicked.")
+    permissions.reload(config)
+    await asyncio.gather(
+        cmd.reply(f"✅ Permissions reloaded ({len(config.staff_roles)} staff roles).", ephemeral=True),
+        log_action(cmd.actor, "Permissions Reloaded", f"{cmd.actor.mention} reloaded the staff role configuration."),
+    )
 
-@bot.command(name="ban")
-async def ban_prefix(ctx, member: discord.Member, *, reason: str = None):
-    if not can_ban(ctx.author):
-        await ctx.send("❌ You cannot use the ban command.")
+async def backfill_core(cmd: CommandContext, action: str = "status", before: str = None):
+    if not is_staff(cmd.actor):
+        await cmd.reply(NO_PERMISSION, ephemeral=True)
         return
-    if member.top_role >= ctx.author.top_role:
-        await ctx.send("❌ Cannot ban someone with equal/higher role.")
+    if action == "status":
+        status = backfill_job.status()
+        if status is None:
+            status = "No backfill is running." + (f" Last run stopped: {backfill_job.error}" if backfill_job.error else "")
+        await cmd.reply(status, ephemeral=True)
         return
-    await member.ban(reason=reason)
-    await log_action(member, "Ban", f"{ctx.author.mention} banned {member.mention}\nReason: {reason}", color=discord.Color.red())
-    await ctx.send(f"{member.mention} has been banned.")
+    if action == "cancel":
+        if not backfill_job.running:
+            await cmd.reply("❌ No backfill is running.", ephemeral=True)
+            return
+        await backfill_job.cancel()
+        await asyncio.gather(
+            cmd.reply("⏸️ Backfill stopped. Run it again with the same cutoff to resume.", ephemeral=True),
+            log_action(cmd.actor, "Backfill Stopped", f"{cmd.actor.mention} stopped the message count backfill."),
+        )
+        return
+    if action != "start":
+        await cmd.reply("❌ Action must be start, status or cancel.", ephemeral=True)
+        return
+    try:
+        if before:
+            cutoff = parse_time_bound(before)
+        else:
+            started = await backfill_job.pending_cutoff() or await storage.get_meta(COUNTING_STARTED_KEY)
+            if started is None:
+                raise ValueError("I don't know when counting started; pass `before` (e.g. 2025-01-31).")
+            cutoff = started if isinstance(started, datetime) else datetime.fromisoformat(started)
+    except ValueError as e:
+        await cmd.reply(f"❌ {e}", ephemeral=True)
+        return
+    try:
+        await backfill_job.start(cmd.guild.text_channels, cutoff)
+    except RuntimeError as e:
+        await cmd.reply(f"❌ {e}", ephemeral=True)
+        return
+    await asyncio.gather(
+        cmd.reply(f"⏪ Counting messages sent before {discord.utils.format_dt(cutoff)} "
+                  f"in {len(cmd.guild.text_channels)} channels. Check progress with `backfill status`.", ephemeral=True),
+        log_action(cmd.actor, "Backfill Started",
+                   f"{cmd.actor.mention} started a message count backfill (before {discord.utils.format_dt(cutoff)})."),
+    )
 
-@bot.command(name="timeout")
-async def timeout_prefix(ctx, member: discord.Member, duration: str, *, reason: str = None):
-    if not is_staff(ctx.author):
-        await ctx.send("❌ You do not have permission.")
+# -----------------------------
+# --- Moderation Cases ---
+# -----------------------------
+CASES_PAGE_SIZE = 10
+
+def format_duration(seconds: int):
+    for unit, size in (("d", 86400), ("h", 3600), ("m", 60)):
+        if seconds >= size and seconds % size == 0:
+            return f"{seconds // size}{unit}"
+    return f"{seconds}s"
+
+def case_time(case):
+    return discord.utils.format_dt(datetime.fromisoformat(case.created_at), "R")
+
+def case_line(case):
+    line = f"**#{case.case_id}** {case.action} {case_time(case)} by <@{case.actor_id}>"
+    if case.duration:
+        line += f" ({format_duration(case.duration)})"
+    return line + f" — {case.reason or 'No reason given'}"
+
+async def cases_core(cmd: CommandContext, user: discord.User, page: int = 1):
+    if not is_staff(cmd.actor):
+        await cmd.reply(NO_PERMISSION, ephemeral=True)
         return
-    if ctx.author.id == member.id:
-        await ctx.send("❌ You can't timeout yourself!")
+    page = max(page, 1)
+    total, cases = await storage.cases_for(user.id, CASES_PAGE_SIZE, (page - 1) * CASES_PAGE_SIZE)
+    pages = max(1, -(-total // CASES_PAGE_SIZE))
+    embed = discord.Embed(title=f"📁 Cases for {user}", color=discord.Color.blue(),
+                          description="\n".join(case_line(case) for case in cases) or "No cases found.")
+    embed.set_footer(text=f"Page {min(page, pages)}/{pages} • {total:,} cases")
+    await cmd.reply(embed=embed, ephemeral=True)
+
+async def case_core(cmd: CommandContext, case_id: int):
+    if not is_staff(cmd.actor):
+        await cmd.reply(NO_PERMISSION, ephemeral=True)
+        return
+    case = await storage.get_case(case_id)
+    if case is None:
+        await cmd.reply(f"❌ Case #{case_id} doesn't exist.", ephemeral=True)
         return
+    embed = discord.Embed(title=f"📁 Case #{case.case_id} — {case.action}", color=discord.Color.blue())
+    if case.target_id:
+        embed.add_field(name="Target", value=f"<@{case.target_id}> ({case.target_id})")
+    embed.add_field(name="Moderator", value=f"<@{case.actor_id}>")
+    if case.channel_id:
+        embed.add_field(name="Channel", value=f"<#{case.channel_id}>")
+    if case.duration:
+        embed.add_field(name="Duration", value=format_duration(case.duration))
+    embed.add_field(name="When", value=case_time(case))
+    embed.add_field(name="Reason", value=case.reason or "No reason given", inline=False)
+    if case.details:
+        embed.add_field(name="Details", value=case.details, inline=False)
+    if case.updated_at:
+        embed.set_footer(text=f"Reason edited {case.updated_at[:16].replace('T', ' ')} UTC")
+    await cmd.reply(embed=embed, ephemeral=True)
 
-    unit = duration[-1].lower()
-    try:
-        amount = int(duration[:-1])
-    except ValueError:
-        await ctx.send(":x: Invalid duration format! Use e.g., 30s, 5m, 2h, 7d.")
+async def reason_core(cmd: CommandContext, case_id: int, reason: str):
+    if not is_staff(cmd.actor):
+        await cmd.reply(NO_PERMISSION, ephemeral=True)
+        return
+    if not await storage.update_case_reason(case_id, reason):
+        await cmd.reply(f"❌ Case #{case_id} doesn't exist.", ephemeral=True)
         return
+    await asyncio.gather(
+        cmd.reply(f"✅ Updated the reason for case #{case_id}.", ephemeral=True),
+        log_action(cmd.actor, f"Reason Updated | Case #{case_id}", f"{cmd.actor.mention} set the reason to: {reason}"),
+    )
 
-    delta = {"s": timedelta(seconds=amount),
-             "m": timedelta(minutes=amount),
-             "h": timedelta(hours=amount),
-             "d": timedelta(days=amount)}.get(unit)
+# -----------------------------
+# --- Mass Moderation ---
+# -----------------------------
+MASS_ACTION_LIMIT = int(os.getenv("MASS_ACTION_LIMIT", "500"))
+MASS_ACTION_CONCURRENCY = int(os.getenv("MASS_ACTION_CONCURRENCY", "4"))
+MASS_VERBS = {"Ban": ("ban", "banned"), "Kick": ("kick", "kicked"), "Timeout": ("timeout", "timed out")}
 
-    if not delta:
-        await ctx.send(":x: Invalid duration unit! Use s, m, h, or d.")
+class MassFlags(commands.FlagConverter):
+    ids: str = None
+    joined: int = None
+    age: int = None
+    reason: str = None
+
+def parse_ids(text: str):
+    return list(dict.fromkeys(int(match) for match in re.findall(r"\d{15,21}", text or "")))
+
+def can_act_on(actor: discord.Member, member: discord.Member):
+    me = member.guild.me
+    return (member.id not in (actor.id, me.id) and not is_staff(member)
+            and permissions.outranks(actor, member) and permissions.outranks(me, member))
+
+def select_mass_targets(cmd: CommandContext, ids, joined, age, members_only):
+    """Return (targets, skipped). Filters narrow the listed IDs, or all cached
+    members when no IDs are given. IDs of users who already left are only
+    kept for bans without filters (as discord.Object), since there is no join
+    date or account age to check."""
+    guild = cmd.guild
+    targets, skipped = [], 0
+    filtered = bool(joined or age)
+    if ids:
+        candidates = []
+        for user_id in parse_ids(ids):
+            member = guild.get_member(user_id)
+            if member is not None:
+                candidates.append(member)
+            elif members_only or filtered:
+                skipped += 1
+            else:
+                targets.append(discord.Object(id=user_id))
+    else:
+        candidates = [member for member in guild.members if not member.bot]
+
+    now = datetime.now(timezone.utc)
+    joined_after = now - timedelta(minutes=joined) if joined else None
+    created_after = now - timedelta(days=age) if age else None
+    for member in candidates:
+        if joined_after and (member.joined_at is None or member.joined_at < joined_after):
+            continue
+        if created_after and member.created_at < created_after:
+            continue
+        if can_act_on(cmd.actor, member):
+            targets.append(member)
+        else:
+            skipped += 1
+    return targets, skipped
+
+def describe_mass_criteria(ids, joined, age):
+    parts = [f"{len(parse_ids(ids))} listed IDs"] if ids else []
+    if joined:
+        parts.append(f"joined in the last {joined} minutes")
+    if age:
+        parts.append(f"accounts younger than {age} days")
+    return " and ".join(parts)
+
+async def mass_core(cmd: CommandContext, action: str, ids=None, joined=None, age=None, reason=None, duration=None):
+    verb, past = MASS_VERBS[action]
+    if not permissions.can(cmd.actor, verb):
+        await cmd.reply(NO_PERMISSION, ephemeral=True)
+        return
+    if not ids and not joined and not age:
+        await cmd.reply("❌ Give a list of IDs or at least one filter (joined, age).", ephemeral=True)
+        return
+    delta = None
+    if action == "Timeout":
+        try:
+            delta = parse_duration(duration)
+        except ValueError as e:
+            await cmd.reply(str(e), ephemeral=True)
+            return
+    targets, skipped = select_mass_targets(cmd, ids, joined, age, members_only=action != "Ban")
+    if not targets:
+        await cmd.reply(f"❌ No members matched ({skipped} skipped: staff, higher roles or not in the server).", ephemeral=True)
+        return
+    if len(targets) > MASS_ACTION_LIMIT:
+        await cmd.reply(f"❌ {len(targets)} members matched; the limit is {MASS_ACTION_LIMIT}. Narrow the filters.", ephemeral=True)
         return
 
-    until_time = datetime.now(timezone.utc) + delta
-    await member.edit(timed_out_until=until_time, reason=reason)
-    await log_action(member, "Timeout", f"{ctx.author.mention} timed out {member.mention} for {duration}. Reason: {reason}", color=discord.Color.orange())
-    await ctx.send(f"{member.mention} has been timed out for {duration}. Reason: {reason}")
+    await cmd.defer()
+    if not cmd.is_slash:
+        await cmd.reply(f"⏳ Mass {verb}: 0/{len(targets)}…")
 
-@bot.command(name="purge")
-async def purge_prefix(ctx, amount: int):
-    if not is_staff(ctx.author):
-        await ctx.send("❌ You do not have permission.")
+    async def progress(result):
+        await cmd.update(f"⏳ Mass {verb}: {result.processed}/{result.total}, {len(result.failed)} failed…")
+
+    audit_reason = f"Mass {verb} by {cmd.actor}: {reason or 'No reason given'}"
+    if action == "Ban":
+        result = await run_bulk_ban(cmd.guild, targets, audit_reason, MASS_ACTION_CONCURRENCY, progress)
+    elif action == "Kick":
+        result = await run_mass_action(targets, lambda member: member.kick(reason=audit_reason),
+                                       MASS_ACTION_CONCURRENCY, progress)
+    else:
+        result = await run_mass_action(targets, lambda member: apply_timeout(member, delta, audit_reason),
+                                       MASS_ACTION_CONCURRENCY, progress)
+
+    criteria = describe_mass_criteria(ids, joined, age)
+    case_ids = await storage.add_cases(action, cmd.actor.id, result.done, reason,
+                                       duration=int(delta.total_seconds()) if delta else None,
+                                       details=f"Mass {verb}: {criteria}")
+    cases = f"Cases #{case_ids[0]}–#{case_ids[-1]}" if case_ids else "No cases"
+    summary = f"✅ {len(result.done)} members {past}."
+    if result.failed:
+        summary += f" {len(result.failed)} failed."
+    if skipped:
+        summary += f" {skipped} skipped."
+    details = (f"{cmd.actor.mention} {past} {len(result.done)} members ({criteria})"
+               + (f" for {duration}" if duration else "") + f".\nReason: {reason}")
+    if result.failed:
+        details += f"\nFailed: {len(result.failed)}"
+    if result.done:
+        details += "\n" + " ".join(f"<@{user_id}>" for user_id in result.done[:40])
+        if len(result.done) > 40:
+            details += f" and {len(result.done) - 40} more"
+    await asyncio.gather(
+        cmd.update(f"{summary} ({cases})"),
+        log_action(cmd.actor, f"Mass {action} | {cases}", details,
+                   color=discord.Color.red() if action == "Ban" else discord.Color.orange()),
+    )
+
+async def massban_core(cmd: CommandContext, ids=None, joined=None, age=None, reason=None):
+    await mass_core(cmd, "Ban", ids, joined, age, reason)
+
+async def masskick_core(cmd: CommandContext, ids=None, joined=None, age=None, reason=None):
+    await mass_core(cmd, "Kick", ids, joined, age, reason)
+
+async def masstimeout_core(cmd: CommandContext, duration: str, ids=None, joined=None, age=None, reason=None):
+    await mass_core(cmd, "Timeout", ids, joined, age, reason, duration)
+
+# -----------------------------
+# --- Leaderboard ---
+# -----------------------------
+LEADERBOARD_PAGE_SIZE = 10
+
+async def leaderboard_embed(page: int):
+    # Apply pending increments first so the standings are current.
+    await message_counts.flush()
+    total = await storage.ranked_users()
+    pages = max(1, -(-total // LEADERBOARD_PAGE_SIZE))
+    page = max(0, min(page, pages - 1))
+    rows = await storage.top_counts(LEADERBOARD_PAGE_SIZE, page * LEADERBOARD_PAGE_SIZE)
+    lines = [f"**#{page * LEADERBOARD_PAGE_SIZE + i + 1}** <@{user_id}> — {count:,} messages"
+             for i, (user_id, count) in enumerate(rows)]
+    embed = discord.Embed(title="🏆 Message Leaderboard", description="\n".join(lines) or "No messages counted yet.",
+                          color=discord.Color.gold())
+    embed.set_footer(text=f"Page {page + 1}/{pages} • {total:,} members ranked")
+    return embed, page, pages
+
+class LeaderboardView(discord.ui.View):
+    def __init__(self, owner_id: int, page: int, pages: int):
+        super().__init__(timeout=120)
+        self.owner_id = owner_id
+        self.page = page
+        self.pages = pages
+        self.update_buttons()
+
+    def update_buttons(self):
+        self.previous_page.disabled = self.page <= 0
+        self.next_page.disabled = self.page >= self.pages - 1
+
+    async def interaction_check(self, interaction: Interaction):
+        if interaction.user.id != self.owner_id:
+            await interaction.response.send_message("❌ Run the leaderboard command yourself to browse it.", ephemeral=True)
+            return False
+        return True
+
+    async def show(self, interaction: Interaction, page: int):
+        embed, self.page, self.pages = await leaderboard_embed(page)
+        self.update_buttons()
+        await interaction.response.edit_message(embed=embed, view=self)
+
+    @discord.ui.button(label="◀ Previous", style=discord.ButtonStyle.secondary)
+    async def previous_page(self, interaction: Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page - 1)
+
+    @discord.ui.button(label="Next ▶", style=discord.ButtonStyle.secondary)
+    async def next_page(self, interaction: Interaction, button: discord.ui.Button):
+        await self.show(interaction, self.page + 1)
+
+async def leaderboard_core(cmd: CommandContext, page: int = 1):
+    await cmd.defer()
+    embed, page, pages = await leaderboard_embed(page - 1)
+    view = LeaderboardView(cmd.actor.id, page, pages)
+    if cmd.is_slash:
+        await cmd.interaction.followup.send(embed=embed, view=view)
+    else:
+        await cmd.ctx.send(embed=embed, view=view)
+
+async def rank_core(cmd: CommandContext, member: discord.Member = None):
+    member = member or cmd.actor
+    await message_counts.flush()
+    rank, count = await storage.rank(member.id)
+    if rank is None:
+        await cmd.reply(f"{member.mention} hasn't sent any counted messages yet.")
         return
-    deleted = await ctx.channel.purge(limit=amount)
-    await log_action(ctx.author, "Purge", f"{ctx.author.mention} deleted {len(deleted)} messages in {ctx.channel.mention}")
-    await ctx.send(f"✅ Deleted {len(deleted)} messages.", delete_after=5)
+    total = await storage.ranked_users()
+    remaining = TRUSTED_MESSAGE_COUNT - count
+    trusted = f"{remaining:,} messages to Trusted." if remaining > 0 else "Trusted threshold reached."
+    await cmd.reply(f"📊 {member.mention} is ranked **#{rank:,}** of {total:,} with **{count:,}** messages. {trusted}")
+
+# -----------------------------
+# --- Activity ---
+# -----------------------------
+async def activity_core(cmd: CommandContext, member: discord.Member = None, channel: discord.TextChannel = None):
+    await activity_history.flush()
+    hour = current_hour()
+    week, month = hour - 7 * 24, hour - 30 * 24
+
+    if member is None and channel is None:
+        top_users = await storage.top_activity(USER, week)
+        top_channels = await storage.top_activity(CHANNEL, week)
+        peak = await storage.activity_peak_hour(week)
+        embed = discord.Embed(title="📈 Server Activity (last 7 days)", color=discord.Color.blue())
+        embed.add_field(name="Most Active Members",
+                        value="\n".join(f"<@{user_id}> — {count:,}" for user_id, count in top_users) or "No activity yet.")
+        embed.add_field(name="Busiest Channels",
+                        value="\n".join(f"<#{channel_id}> — {count:,}" for channel_id, count in top_channels) or "No activity yet.")
+        if peak:
+            embed.add_field(name="Peak Hour", value=f"{discord.utils.format_dt(datetime.fromtimestamp(peak[0] * 3600, timezone.utc))} — {peak[1]:,} messages",
+                            inline=False)
+        await cmd.reply(embed=embed)
+        return
+
+    embed = discord.Embed(title="📈 Activity", color=discord.Color.blue())
+    for kind, target, mention in ((USER, member, member and member.mention), (CHANNEL, channel, channel and channel.mention)):
+        if target is None:
+            continue
+        last_week, last_month = await storage.activity_totals(kind, target.id, (week, month))
+        peak = await storage.activity_peak_hour(week, kind, target.id)
+        value = f"{mention}\nLast 7 days: **{last_week:,}**\nLast 30 days: **{last_month:,}**"
+        if peak:
+            value += f"\nPeak hour: {discord.utils.format_dt(datetime.fromtimestamp(peak[0] * 3600, timezone.utc))} ({peak[1]:,})"
+        embed.add_field(name="Member" if kind == USER else "Channel", value=value)
+    await cmd.reply(embed=embed)
+
+# -----------------------------
+# --- Slash Commands ---
+# -----------------------------
+def slash(name, interaction: Interaction):
+    return CommandContext.from_interaction(name, interaction)
+
+@bot.tree.command(name="help", description="Show all commands & info", guild=discord.Object(id=GUILD_ID))
+async def help_slash(interaction: Interaction):
+    await run_command(slash("help", interaction), help_core)
+
+@bot.tree.command(name="ping", description="Check bot latency & uptime", guild=discord.Object(id=GUILD_ID))
+async def ping_slash(interaction: Interaction):
+    await run_command(slash("ping", interaction), ping_core)
+
+@bot.tree.command(name="kick", description="Kick a user", guild=discord.Object(id=GUILD_ID))
+async def kick_slash(interaction: Interaction, member: discord.Member, reason: str = None):
+    await run_command(slash("kick", interaction), kick_core, member, reason)
+
+@bot.tree.command(name="ban", description="Ban a user", guild=discord.Object(id=GUILD_ID))
+async def ban_slash(interaction: Interaction, member: discord.Member, reason: str = None):
+    await run_command(slash("ban", interaction), ban_core, member, reason)
+
+@bot.tree.command(name="timeout", description="Timeout a user", guild=discord.Object(id=GUILD_ID))
+async def timeout_slash(interaction: Interaction, member: discord.Member, duration: str, reason: str = None):
+    await run_command(slash("timeout", interaction), timeout_core, member, duration, reason)
+
+@bot.tree.command(name="purge", description="Delete messages", guild=discord.Object(id=GUILD_ID))
+@app_commands.describe(amount="How many recent messages to search",
+                       user="Only delete messages from this user",
+                       bots="Only delete messages from bots",
+                       contains="Only delete messages matching this regex",
+                       attachments="Only delete messages with attachments",
+                       since="Only messages newer than this (e.g. 2h, 7d, 2025-01-31)",
+                       until="Only messages older than this (e.g. 2h, 7d, 2025-01-31)")
+async def purge_slash(interaction: Interaction, amount: int, user: discord.Member = None, bots: bool = False,
+                      contains: str = None, attachments: bool = False, since: str = None, until: str = None):
+    await run_command(slash("purge", interaction), purge_core, amount, user, bots, contains, attachments, since, until)
+
+@bot.tree.command(name="massban", description="Ban many users at once (Staff only)", guild=discord.Object(id=GUILD_ID))
+@app_commands.describe(ids="User IDs or mentions, separated by spaces",
+                       joined="Members who joined in the last N minutes",
+                       age="Accounts younger than N days",
+                       reason="Reason for the audit log and cases")
+async def massban_slash(interaction: Interaction, ids: str = None, joined: int = None, age: int = None, reason: str = None):
+    await run_command(slash("massban", interaction), massban_core, ids, joined, age, reason)
+
+@bot.tree.command(name="masskick", description="Kick many members at once (Staff only)", guild=discord.Object(id=GUILD_ID))
+@app_commands.describe(ids="User IDs or mentions, separated by spaces",
+                       joined="Members who joined in the last N minutes",
+                       age="Accounts younger than N days",
+                       reason="Reason for the audit log and cases")
+async def masskick_slash(interaction: Interaction, ids: str = None, joined: int = None, age: int = None, reason: str = None):
+    await run_command(slash("masskick", interaction), masskick_core, ids, joined, age, reason)
+
+@bot.tree.command(name="masstimeout", description="Timeout many members at once (Staff only)", guild=discord.Object(id=GUILD_ID))
+@app_commands.describe(ids="User IDs or mentions, separated by spaces",
+                       joined="Members who joined in the last N minutes",
+                       age="Accounts younger than N days",
+                       reason="Reason for the audit log and cases")
+async def masstimeout_slash(interaction: Interaction, duration: str, ids: str = None, joined: int = None, age: int = None,
+                            reason: str = None):
+    await run_command(slash("masstimeout", interaction), masstimeout_core, duration, ids, joined, age, reason)
+
+@bot.tree.command(name="cases", description="A user's moderation history (Staff only)", guild=discord.Object(id=GUILD_ID))
+async def cases_slash(interaction: Interaction, user: discord.User, page: int = 1):
+    await run_command(slash("cases", interaction), cases_core, user, page)
+
+@bot.tree.command(name="case", description="Show a moderation case (Staff only)", guild=discord.Object(id=GUILD_ID))
+async def case_slash(interaction: Interaction, case_id: int):
+    await run_command(slash("case", interaction), case_core, case_id)
+
+@bot.tree.command(name="reason", description="Change a case's reason (Staff only)", guild=discord.Object(id=GUILD_ID))
+async def reason_slash(interaction: Interaction, case_id: int, reason: str):
+    await run_command(slash("reason", interaction), reason_core, case_id, reason)
+
+@bot.tree.command(name="lock", description="Lock channel", guild=discord.Object(id=GUILD_ID))
+async def lock_slash(interaction: Interaction):
+    await run_command(slash("lock", interaction), lock_core)
+
+@bot.tree.command(name="unlock", description="Unlock channel", guild=discord.Object(id=GUILD_ID))
+async def unlock_slash(interaction: Interaction):
+    await run_command(slash("unlock", interaction), unlock_core)
+
+@bot.tree.command(name="say", description="Bot says a message", guild=discord.Object(id=GUILD_ID))
+async def say_slash(interaction: Interaction, message: str):
+    await run_command(slash("say", interaction), say_core, message)
+
+@bot.tree.command(name="embed", description="Create an embed", guild=discord.Object(id=GUILD_ID))
+async def embed_slash(interaction: Interaction, title: str, description: str):
+    await run_command(slash("embed", interaction), embed_core, title, description)
+
+@bot.tree.command(name="leaderboard", description="Top message senders", guild=discord.Object(id=GUILD_ID))
+async def leaderboard_slash(interaction: Interaction, page: int = 1):
+    await run_command(slash("leaderboard", interaction), leaderboard_core, page)
+
+@bot.tree.command(name="rank", description="Show a member's message rank", guild=discord.Object(id=GUILD_ID))
+async def rank_slash(interaction: Interaction, member: discord.Member = None):
+    await run_command(slash("rank", interaction), rank_core, member)
+
+@bot.tree.command(name="activity", description="Rolling 7/30-day message activity", guild=discord.Object(id=GUILD_ID))
+async def activity_slash(interaction: Interaction, member: discord.Member = None, channel: discord.TextChannel = None):
+    await run_command(slash("activity", interaction), activity_core, member, channel)
+
+@bot.tree.command(name="stats", description="Bot performance stats (Staff only)", guild=discord.Object(id=GUILD_ID))
+async def stats_slash(interaction: Interaction):
+    await run_command(slash("stats", interaction), stats_core)
+
+@bot.tree.command(name="sync", description="Force a slash command sync (Staff only)", guild=discord.Object(id=GUILD_ID))
+async def sync_slash(interaction: Interaction):
+    await run_command(slash("sync", interaction), sync_core)
+
+@bot.tree.command(name="reloadperms", description="Reload staff roles from .env (Staff only)", guild=discord.Object(id=GUILD_ID))
+async def reload_permissions_slash(interaction: Interaction):
+    await run_command(slash("reloadperms", interaction), reload_permissions_core)
+
+@bot.tree.command(name="backfill", description="Count historical messages (Staff only)", guild=discord.Object(id=GUILD_ID))
+@app_commands.describe(action="Start, check or stop the backfill",
+                       before="Only messages older than this (default: when counting started)")
+async def backfill_slash(interaction: Interaction, action: Literal["start", "status", "cancel"] = "status",
+                         before: str = None):
+    await run_command(slash("backfill", interaction), backfill_core, action, before)
+
+# -----------------------------
+# --- Prefix Commands ---
+# -----------------------------
+def prefix(name, ctx):
+    return CommandContext.from_context(name, ctx)
+
+@bot.command(name="help")
+async def help_prefix(ctx):
+    await run_command(prefix("help", ctx), help_core)
+
+@bot.command(name="ping")
+async def ping_prefix(ctx):
+    await run_command(prefix("ping", ctx), ping_core)
+
+@bot.command(name="kick")
+async def kick_prefix(ctx, member: discord.Member, *, reason: str = None):
+    await run_command(prefix("kick", ctx), kick_core, member, reason)
+
+@bot.command(name="ban")
+async def ban_prefix(ctx, member: discord.Member, *, reason: str = None):
+    await run_command(prefix("ban", ctx), ban_core, member, reason)
+
+@bot.command(name="timeout")
+async def timeout_prefix(ctx, member: discord.Member, duration: str, *, reason: str = None):
+    await run_command(prefix("timeout", ctx), timeout_core, member, duration, reason)
+
+@bot.command(name="purge")
+async def purge_prefix(ctx, amount: int, *, flags: PurgeFlags):
+    await run_command(prefix("purge", ctx), purge_core, amount, flags.user, flags.bots, flags.contains,
+                      flags.attachments, flags.since, flags.until)
+
+@bot.command(name="massban")
+async def massban_prefix(ctx, *, flags: MassFlags):
+    await run_command(prefix("massban", ctx), massban_core, flags.ids, flags.joined, flags.age, flags.reason)
+
+@bot.command(name="masskick")
+async def masskick_prefix(ctx, *, flags: MassFlags):
+    await run_command(prefix("masskick", ctx), masskick_core, flags.ids, flags.joined, flags.age, flags.reason)
+
+@bot.command(name="masstimeout")
+async def masstimeout_prefix(ctx, duration: str, *, flags: MassFlags):
+    await run_command(prefix("masstimeout", ctx), masstimeout_core, duration, flags.ids, flags.joined, flags.age, flags.reason)
+
+@bot.command(name="cases")
+async def cases_prefix(ctx, user: discord.User, page: int = 1):
+    await run_command(prefix("cases", ctx), cases_core, user, page)
+
+@bot.command(name="case")
+async def case_prefix(ctx, case_id: int):
+    await run_command(prefix("case", ctx), case_core, case_id)
+
+@bot.command(name="reason")
+async def reason_prefix(ctx, case_id: int, *, reason: str):
+    await run_command(prefix("reason", ctx), reason_core, case_id, reason)
 
 @bot.command(name="lock")
 async def lock_prefix(ctx):
-    if not is_staff(ctx.author):
-        await ctx.send("❌ You do not have permission.")
-        return
-    await ctx.channel.set_permissions(ctx.guild.default_role, send_messages=False)
-    await log_action(ctx.author, "Channel Locked", f"{ctx.author.mention} locked {ctx.channel.mention}")
-    await ctx.send(f"{ctx.channel.mention} is now locked.")
+    await run_command(prefix("lock", ctx), lock_core)
 
 @bot.command(name="unlock")
 async def unlock_prefix(ctx):
-    if not is_staff(ctx.author):
-        await ctx.send("❌ You do not have permission.")
-        return
-    await ctx.channel.set_permissions(ctx.guild.default_role, send_messages=True)
-    await log_action(ctx.author, "Channel Unlocked", f"{ctx.author.mention} unlocked {ctx.channel.mention}")
-    await ctx.send(f"{ctx.channel.mention} is now unlocked.")
+    await run_command(prefix("unlock", ctx), unlock_core)
 
 @bot.command(name="say")
 async def say_prefix(ctx, *, message: str):
-    if not is_staff(ctx.author):
-        await ctx.send("❌ You do not have permission.")
-        return
-    await ctx.send(message)
-    await log_action(ctx.author, "Say", f"{ctx.author.mention} used +say: {message}")
+    await run_command(prefix("say", ctx), say_core, message)
 
 @bot.command(name="embed")
 async def embed_prefix(ctx, title: str, *, description: str):
-    if not is_staff(ctx.author):
-        await ctx.send("❌ You do not have permission.")
-        return
-    embed = discord.Embed(title=title, description=description, color=discord.Color.blue())
-    await ctx.send(embed=embed)
-    await log_action(ctx.author, "Embed", f"{ctx.author.mention} sent an embed titled '{title}'")
+    await run_command(prefix("embed", ctx), embed_core, title, description)
+
+@bot.command(name="leaderboard", aliases=["lb"])
+async def leaderboard_prefix(ctx, page: int = 1):
+    await run_command(prefix("leaderboard", ctx), leaderboard_core, page)
+
+@bot.command(name="rank")
+async def rank_prefix(ctx, member: discord.Member = None):
+    await run_command(prefix("rank", ctx), rank_core, member)
+
+@bot.command(name="activity")
+async def activity_prefix(ctx, member: discord.Member = None, channel: discord.TextChannel = None):
+    await run_command(prefix("activity", ctx), activity_core, member, channel)
+
+@bot.command(name="stats")
+async def stats_prefix(ctx):
+    await run_command(prefix("stats", ctx), stats_core)
+
+@bot.command(name="sync")
+async def sync_prefix(ctx):
+    await run_command(prefix("sync", ctx), sync_core)
+
+@bot.command(name="reloadperms")
+async def reload_permissions_prefix(ctx):
+    await run_command(prefix("reloadperms", ctx), reload_permissions_core)
+
+@bot.command(name="backfill")
+async def backfill_prefix(ctx, action: str = "status", before: str = None):
+    await run_command(prefix("backfill", ctx), backfill_core, action.lower(), before)
 
 # -----------------------------
 # --- Run Bot ---
 # -----------------------------
-bot.run(TOKEN)
+if __name__ == "__main__":
+    bot.run(TOKEN)
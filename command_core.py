@@ -0,0 +1,112 @@
+import time
+from collections import deque
+
+import discord
+
+from metrics import COMMAND_LATENCY, COMMANDS
+
+
+class CommandContext:
+    """One shape for a slash interaction or a prefix command context, so the
+    command implementations can be shared by both front-ends.
+
+    Slash commands must answer within 3 seconds; `defer` acknowledges the
+    interaction straight away and later `reply`/`update` calls go through
+    the followup webhook instead. For prefix commands `defer` is a no-op.
+    """
+
+    def __init__(self, name, actor, channel, guild, interaction=None, ctx=None):
+        self.name = name
+        self.actor = actor
+        self.channel = channel
+        self.guild = guild
+        self.interaction = interaction
+        self.ctx = ctx
+        self.message = None
+
+    @classmethod
+    def from_interaction(cls, name, interaction):
+        return cls(name, interaction.user, interaction.channel, interaction.guild, interaction=interaction)
+
+    @classmethod
+    def from_context(cls, name, ctx):
+        return cls(name, ctx.author, ctx.channel, ctx.guild, ctx=ctx)
+
+    @property
+    def is_slash(self):
+        return self.interaction is not None
+
+    @property
+    def prefix(self):
+        return "/" if self.is_slash else "+"
+
+    async def defer(self, ephemeral=False):
+        if self.is_slash and not self.interaction.response.is_done():
+            await self.interaction.response.defer(ephemeral=ephemeral, thinking=True)
+
+    async def reply(self, content=None, *, embed=discord.utils.MISSING, ephemeral=False, delete_after=None):
+        if not self.is_slash:
+            self.message = await self.ctx.send(content, embed=embed or None, delete_after=delete_after)
+        elif not self.interaction.response.is_done():
+            await self.interaction.response.send_message(content, embed=embed, ephemeral=ephemeral)
+        else:
+            self.message = await self.interaction.followup.send(content, embed=embed, ephemeral=ephemeral, wait=True)
+        return self.message
+
+    async def update(self, content, *, delete_after=None):
+        """Edit the deferred response (slash) or the last reply (prefix)."""
+        try:
+            if self.is_slash:
+                await self.interaction.edit_original_response(content=content)
+            elif self.message is not None:
+                await self.message.edit(content=content, delete_after=delete_after)
+            else:
+                await self.reply(content, delete_after=delete_after)
+        except discord.HTTPException:
+            pass
+
+
+class LatencyTracker:
+    """Keeps the most recent `window` durations per command for percentiles."""
+
+    def __init__(self, window=1024):
+        self.window = window
+        self.samples = {}
+        self.counts = {}
+
+    def record(self, name, seconds):
+        samples = self.samples.get(name)
+        if samples is None:
+            samples = self.samples[name] = deque(maxlen=self.window)
+        samples.append(seconds)
+        self.counts[name] = self.counts.get(name, 0) + 1
+
+    @staticmethod
+    def _percentile(ordered, p):
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def summary(self):
+        """Return (name, total calls, p50 seconds, p99 seconds) per command."""
+        rows = []
+        for name, samples in sorted(self.samples.items()):
+            ordered = sorted(samples)
+            rows.append((name, self.counts[name], self._percentile(ordered, 50), self._percentile(ordered, 99)))
+        return rows
+
+
+command_latency = LatencyTracker()
+
+
+async def run_command(cmd, implementation, *args):
+    """Run a shared command implementation and record how long it took."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        await implementation(cmd, *args)
+        outcome = "ok"
+    finally:
+        elapsed = time.perf_counter() - start
+        command_latency.record(cmd.name, elapsed)
+        COMMAND_LATENCY.observe(elapsed, cmd.name)
+        COMMANDS.inc(cmd.name, outcome)
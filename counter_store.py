@@ -0,0 +1,111 @@
+import asyncio
+from collections import OrderedDict
+
+
+class CounterStore:
+    """Per-user message counters, written behind to the database.
+
+    Increments land in an in-memory `pending` dict of deltas. A background
+    task upserts the deltas in one batch every `flush_interval` seconds, and
+    once more on close. Totals for recently active users are kept in a
+    bounded LRU cache so the hot path rarely touches the database, and
+    memory stays flat however many members the server has.
+    """
+
+    def __init__(self, storage, flush_interval=30.0, cache_size=50_000):
+        self.storage = storage
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+        self._totals = OrderedDict()
+        self._pending = {}
+        self._inflight = {}
+        self._flush_lock = asyncio.Lock()
+        self._task = None
+
+    def _is_dirty(self, user_id):
+        return user_id in self._pending or user_id in self._inflight
+
+    def _evict(self):
+        # Only clean entries can be dropped: anything unflushed would be lost
+        # from the total the next time the user is loaded from the database.
+        attempts = len(self._totals)
+        while len(self._totals) > self.cache_size and attempts > 0:
+            user_id, total = self._totals.popitem(last=False)
+            if self._is_dirty(user_id):
+                self._totals[user_id] = total
+            attempts -= 1
+
+    async def get(self, user_id):
+        user_id = int(user_id)
+        if user_id in self._totals:
+            return self._totals[user_id]
+        return await self.storage.get_count(user_id)
+
+    async def incr(self, user_id, amount=1):
+        user_id = int(user_id)
+        if user_id not in self._totals:
+            base = await self.storage.get_count(user_id)
+            # Another message from the same user may have loaded it meanwhile.
+            if user_id not in self._totals:
+                self._totals[user_id] = base
+                self._evict()
+        count = self._totals[user_id] + amount
+        self._totals[user_id] = count
+        self._totals.move_to_end(user_id)
+        self._pending[user_id] = self._pending.get(user_id, 0) + amount
+        return count
+
+    async def merge(self, merge_in_db):
+        """Await `merge_in_db()`, a single storage call that adds counts to the
+        database directly and returns them as {user_id: delta}, then fold the
+        deltas into the cached totals.
+
+        The storage thread runs calls in order and the event loop resumes
+        their callers in the same order. So every total loaded before the
+        merge was cached by the time this resumes, and is missing the delta.
+        Every total loaded after it already includes the delta and is not
+        cached yet. The deltas are applied with no await in between, and
+        under the flush lock, so no flush is half done.
+        """
+        async with self._flush_lock:
+            deltas = await merge_in_db()
+            for user_id, delta in deltas.items():
+                if user_id in self._totals:
+                    self._totals[user_id] += delta
+        return deltas
+
+    async def flush(self):
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            self._inflight, self._pending = self._pending, {}
+            try:
+                await self.storage.add_counts(self._inflight)
+            except Exception:
+                for user_id, delta in self._inflight.items():
+                    self._pending[user_id] = self._pending.get(user_id, 0) + delta
+                raise
+            finally:
+                self._inflight = {}
+
+    async def _flush_loop(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"⚠️ Failed to flush message counts: {e}")
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._flush_loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
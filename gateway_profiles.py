@@ -0,0 +1,46 @@
+import discord
+
+# Gateway intent / member cache profiles, selected with INTENTS_PROFILE.
+#
+# full    - everything, including presences and typing (the old behaviour)
+# minimal - only what the bot handles: guilds, members, guild messages and
+#           message content for prefix commands. No presence, typing, voice
+#           or DM streams. Members are still chunked at startup so
+#           on_member_update fires for members who joined before a restart.
+# lean    - minimal, but members are not chunked at startup. Members are
+#           cached only when they join, or when a member update arrives for
+#           them; message authors are never added. The first update for an
+#           uncached member is cached but not dispatched, so a club role
+#           added to someone who joined before the bot started is skipped
+#           until the verification sweep finds it. Lowest memory; that
+#           skipped update is why minimal is the default.
+PROFILES = ("full", "minimal", "lean")
+DEFAULT_PROFILE = "minimal"
+
+
+def minimal_intents():
+    intents = discord.Intents.none()
+    intents.guilds = True
+    intents.members = True
+    intents.guild_messages = True
+    intents.message_content = True
+    return intents
+
+
+def client_options(profile=DEFAULT_PROFILE, chunk_guilds_at_startup=None):
+    """Return the intents/member cache keyword arguments for a profile."""
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown intents profile {profile!r}; expected one of {', '.join(PROFILES)}")
+
+    if profile == "full":
+        intents = discord.Intents.all()
+        cache_flags = discord.MemberCacheFlags.all()
+        chunk = True
+    else:
+        intents = minimal_intents()
+        cache_flags = discord.MemberCacheFlags.from_intents(intents)
+        chunk = profile == "minimal"
+
+    if chunk_guilds_at_startup is not None:
+        chunk = chunk_guilds_at_startup
+    return {"intents": intents, "member_cache_flags": cache_flags, "chunk_guilds_at_startup": chunk}
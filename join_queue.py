@@ -0,0 +1,104 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timedelta, timezone
+
+YOUNG_ACCOUNT_AGE = timedelta(days=30)
+
+
+class JoinQueue:
+    """Bounded queue of new members, processed by a few workers.
+
+    `handle_join(member, raid_mode)` is awaited for each member by up to
+    `workers` concurrent workers. When `raid_threshold` joins arrive within
+    `raid_window` seconds the queue enters raid mode; joins made while in raid
+    mode are summarised every `summary_interval` seconds through
+    `on_summary(joins, young_accounts, interval)` instead of being logged one
+    by one. `on_raid_mode(enabled)` is awaited when raid mode toggles.
+    """
+
+    def __init__(self, handle_join, on_summary, on_raid_mode, workers=4, max_queue=5000,
+                 raid_threshold=10, raid_window=10.0, summary_interval=30.0):
+        self.handle_join = handle_join
+        self.on_summary = on_summary
+        self.on_raid_mode = on_raid_mode
+        self.workers = workers
+        self.raid_threshold = raid_threshold
+        self.raid_window = raid_window
+        self.summary_interval = summary_interval
+        self.raid_mode = False
+        self.dropped = 0
+        self._queue = asyncio.Queue(maxsize=max_queue)
+        self._recent = deque()
+        self._summary_joins = 0
+        self._summary_young = 0
+        self._tasks = []
+
+    @property
+    def depth(self):
+        return self._queue.qsize()
+
+    def _joins_in_window(self, now):
+        while self._recent and now - self._recent[0] > self.raid_window:
+            self._recent.popleft()
+        return len(self._recent)
+
+    def submit(self, member):
+        now = time.monotonic()
+        self._recent.append(now)
+        if not self.raid_mode and self._joins_in_window(now) >= self.raid_threshold:
+            self.raid_mode = True
+            asyncio.create_task(self.on_raid_mode(True))
+
+        if self.raid_mode:
+            self._summary_joins += 1
+            created_at = member.created_at.replace(tzinfo=timezone.utc)
+            if datetime.now(timezone.utc) - created_at < YOUNG_ACCOUNT_AGE:
+                self._summary_young += 1
+
+        # Decided now: a backlog built up during a raid must still be
+        # summarised when the workers reach it after raid mode has ended.
+        try:
+            self._queue.put_nowait((member, self.raid_mode))
+        except asyncio.QueueFull:
+            self.dropped += 1
+
+    async def _worker(self):
+        while True:
+            member, raid_mode = await self._queue.get()
+            try:
+                await self.handle_join(member, raid_mode)
+            except Exception as e:
+                print(f"⚠️ Failed to process join for {member}: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def _summary_loop(self):
+        while True:
+            await asyncio.sleep(self.summary_interval)
+            try:
+                if self._summary_joins:
+                    joins, young = self._summary_joins, self._summary_young
+                    self._summary_joins = self._summary_young = 0
+                    await self.on_summary(joins, young, self.summary_interval)
+                # Leave raid mode once the join rate is back under half the threshold.
+                if self.raid_mode and self._joins_in_window(time.monotonic()) < self.raid_threshold // 2:
+                    self.raid_mode = False
+                    await self.on_raid_mode(False)
+            except Exception as e:
+                print(f"⚠️ Failed to log join summary: {e}")
+
+    async def join(self):
+        """Wait until every submitted member has been processed."""
+        await self._queue.join()
+
+    def start(self):
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+            self._tasks.append(asyncio.create_task(self._summary_loop()))
+
+    async def close(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime, timezone
+
+import discord
+
+HIGH = 0
+LOW = 1
+
+MAX_EMBEDS_PER_MESSAGE = 10
+
+
+class LogDispatcher:
+    """Background sender for log channel embeds.
+
+    `enqueue` never waits on Discord. A single worker coalesces up to ten
+    embeds into one message and paces sends to stay inside the channel's
+    rate limit bucket (`rate` messages every `per` seconds). When the queue
+    is full, low-priority entries are dropped first and reported as a single
+    summary embed on the next send.
+    """
+
+    def __init__(self, get_channel, max_queue=1000, rate=5, per=5.0):
+        self.get_channel = get_channel
+        self.max_queue = max_queue
+        self.rate = rate
+        self.per = per
+        self._queues = (deque(), deque())
+        self._wakeup = asyncio.Event()
+        self._send_times = deque(maxlen=rate)
+        self._dropped = 0
+        self._closing = False
+        self._task = None
+        self.sent_messages = 0
+        self.last_flush_latency = 0.0
+
+    @property
+    def depth(self):
+        return len(self._queues[HIGH]) + len(self._queues[LOW])
+
+    @property
+    def dropped(self):
+        return self._dropped
+
+    def enqueue(self, embed, priority=HIGH):
+        if self.depth >= self.max_queue:
+            if self._queues[LOW]:
+                self._queues[LOW].popleft()
+            elif priority == LOW:
+                self._dropped += 1
+                return
+            else:
+                self._queues[HIGH].popleft()
+            self._dropped += 1
+        self._queues[priority].append((time.monotonic(), embed))
+        self._wakeup.set()
+
+    def _next_batch(self):
+        batch = []
+        oldest = None
+        if self._dropped:
+            batch.append(discord.Embed(
+                title="Log Entries Dropped",
+                description=f"{self._dropped} log entries were dropped while the log queue was full.",
+                color=discord.Color.dark_grey(),
+                timestamp=datetime.now(timezone.utc)
+            ))
+            self._dropped = 0
+        for queue in self._queues:
+            while queue and len(batch) < MAX_EMBEDS_PER_MESSAGE:
+                queued_at, embed = queue.popleft()
+                oldest = queued_at if oldest is None else min(oldest, queued_at)
+                batch.append(embed)
+        return batch, oldest
+
+    async def _wait_for_bucket(self):
+        if len(self._send_times) == self.rate:
+            wait = self.per - (time.monotonic() - self._send_times[0])
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+    async def _send(self, batch, queued_at):
+        channel = self.get_channel()
+        if channel is None:
+            return
+        await self._wait_for_bucket()
+        try:
+            await channel.send(embeds=batch)
+        except discord.HTTPException as e:
+            print(f"⚠️ Failed to send {len(batch)} log entries: {e}")
+        self._send_times.append(time.monotonic())
+        self.sent_messages += 1
+        if queued_at is not None:
+            self.last_flush_latency = time.monotonic() - queued_at
+
+    async def _worker(self):
+        while True:
+            if not self.depth and not self._dropped:
+                if self._closing:
+                    return
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            batch, queued_at = self._next_batch()
+            await self._send(batch, queued_at)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._worker())
+
+    async def close(self, timeout=10.0):
+        """Drain whatever is queued, giving up after `timeout` seconds."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wakeup.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Log queue not drained at shutdown; {self.depth} entries lost.")
+        self._task = None
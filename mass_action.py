@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+import discord
+
+# Discord's bulk ban endpoint takes at most 200 users per call.
+BULK_BAN_MAX = 200
+PROGRESS_INTERVAL = 2.0
+
+
+class MassResult:
+    def __init__(self, total):
+        self.total = total
+        self.done = []
+        self.failed = []
+
+    @property
+    def processed(self):
+        return len(self.done) + len(self.failed)
+
+
+class _Progress:
+    def __init__(self, result, progress):
+        self.result = result
+        self.progress = progress
+        self.last = time.monotonic()
+
+    async def tick(self):
+        if self.progress and time.monotonic() - self.last >= PROGRESS_INTERVAL:
+            self.last = time.monotonic()
+            await self.progress(self.result)
+
+
+async def run_mass_action(targets, action, concurrency=4, progress=None, result=None):
+    """Await `action(target)` for every target, at most `concurrency` at a time.
+
+    discord.py waits out rate limits itself, so failures are not retried;
+    failed targets are collected rather than raised. `progress(result)` is
+    awaited at most every PROGRESS_INTERVAL seconds.
+    """
+    result = result or MassResult(len(targets))
+    ticker = _Progress(result, progress)
+    remaining = iter(targets)
+
+    async def worker():
+        for target in remaining:
+            try:
+                await action(target)
+                result.done.append(target.id)
+            except discord.HTTPException:
+                result.failed.append(target.id)
+            await ticker.tick()
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, len(targets)))))
+    return result
+
+
+async def run_bulk_ban(guild, targets, reason, concurrency=4, progress=None):
+    """Ban `targets` (members or discord.Object) through the bulk ban endpoint,
+    falling back to individual bans where it is unavailable or refused."""
+    if not hasattr(guild, "bulk_ban"):
+        return await run_mass_action(targets, lambda target: guild.ban(target, reason=reason),
+                                     concurrency, progress)
+
+    result = MassResult(len(targets))
+    ticker = _Progress(result, progress)
+    for start in range(0, len(targets), BULK_BAN_MAX):
+        chunk = targets[start:start + BULK_BAN_MAX]
+        try:
+            banned = await guild.bulk_ban(chunk, reason=reason)
+        except discord.HTTPException as e:
+            # A 429 that reaches us is a Cloudflare ban; more calls make it worse.
+            if e.status == 429:
+                result.failed += [target.id for target in chunk]
+                continue
+            await run_mass_action(chunk, lambda target: guild.ban(target, reason=reason),
+                                  concurrency, progress, result)
+            continue
+        result.done += [user.id for user in banned.banned]
+        result.failed += [user.id for user in banned.failed]
+        await ticker.tick()
+    return result
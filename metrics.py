@@ -0,0 +1,214 @@
+import functools
+import logging
+import os
+import time
+
+from aiohttp import web
+
+# Latency buckets in seconds, from sub-millisecond handler work up to slow REST calls.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _format_labels(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+
+    def header(self, kind):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} {kind}"]
+
+
+class Counter(Metric):
+    def __init__(self, name, help_text, label_names=()):
+        super().__init__(name, help_text, label_names)
+        self.values = {}
+
+    def inc(self, *labels, amount=1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def get(self, *labels):
+        return self.values.get(labels, 0)
+
+    def total(self):
+        return sum(self.values.values())
+
+    def render(self):
+        lines = self.header("counter")
+        for labels, value in sorted(self.values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Gauge(Metric):
+    """A gauge that is either set directly or read from `callback` at scrape time."""
+
+    def __init__(self, name, help_text, callback=None):
+        super().__init__(name, help_text)
+        self.callback = callback
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def get(self):
+        return self.callback() if self.callback else self.value
+
+    def render(self):
+        return self.header("gauge") + [f"{self.name} {self.get()}"]
+
+
+class Histogram(Metric):
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+        self.series = {}
+
+    def observe(self, value, *labels):
+        series = self.series.get(labels)
+        if series is None:
+            # Per-bucket (non-cumulative) counts, plus +Inf, then sum.
+            series = self.series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        counts = series[0]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+                break
+        else:
+            counts[-1] += 1
+        series[1] += value
+
+    def count(self, *labels):
+        series = self.series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def quantile(self, q, *labels):
+        """Estimate a quantile as the upper bound of the bucket it falls in."""
+        series = self.series.get(labels)
+        if not series:
+            return None
+        counts = series[0]
+        target = q * sum(counts)
+        running = 0
+        for i, bound in enumerate(self.buckets):
+            running += counts[i]
+            if running >= target:
+                return bound
+        return float("inf")
+
+    def render(self):
+        lines = self.header("histogram")
+        for labels, (counts, total) in sorted(self.series.items()):
+            running = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                running += count
+                bucket_labels = _format_labels(self.label_names + ("le",), labels + (bound,))
+                lines.append(f"{self.name}_bucket{bucket_labels} {running}")
+            label_str = _format_labels(self.label_names, labels)
+            lines.append(f"{self.name}_sum{label_str} {total}")
+            lines.append(f"{self.name}_count{label_str} {running}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def process_rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (FileNotFoundError, IndexError, ValueError):
+        # No procfs (e.g. macOS): fall back to the peak RSS.
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+# --- Bot metrics ---
+registry = Registry()
+EVENT_LATENCY = registry.register(Histogram(
+    "lfcbot_event_handler_seconds", "Time spent in gateway event handlers.", ("event",)))
+COMMAND_LATENCY = registry.register(Histogram(
+    "lfcbot_command_seconds", "Time taken to run a command.", ("command",)))
+COMMANDS = registry.register(Counter(
+    "lfcbot_commands_total", "Commands run, by command and outcome.", ("command", "outcome")))
+REST_REQUESTS = registry.register(Counter(
+    "lfcbot_rest_requests_total", "Discord REST requests made, by method.", ("method",)))
+REST_RATE_LIMITS = registry.register(Counter(
+    "lfcbot_rest_rate_limits_total", "Discord REST 429 responses."))
+HEARTBEAT_LATENCY = registry.register(Histogram(
+    "lfcbot_gateway_heartbeat_seconds", "Sampled gateway heartbeat latency."))
+HEARTBEAT_LAST = registry.register(Gauge(
+    "lfcbot_gateway_heartbeat_last_seconds", "Most recent gateway heartbeat latency."))
+PROCESS_RSS = registry.register(Gauge(
+    "lfcbot_process_resident_memory_bytes", "Resident set size of the bot process.", process_rss_bytes))
+
+
+def instrument_event(handler):
+    """Record an event handler's latency under its function name."""
+    name = handler.__name__
+
+    @functools.wraps(handler)
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await handler(*args, **kwargs)
+        finally:
+            EVENT_LATENCY.observe(time.perf_counter() - start, name)
+    return wrapper
+
+
+def instrument_http(http):
+    """Count REST requests made through a discord.py HTTPClient."""
+    original = http.request
+
+    async def request(route, **kwargs):
+        REST_REQUESTS.inc(route.method)
+        return await original(route, **kwargs)
+
+    http.request = request
+
+
+class RateLimitCounter(logging.Handler):
+    """discord.py retries 429s itself and only logs them; count those log lines."""
+
+    def emit(self, record):
+        if "rate limited" in record.getMessage():
+            REST_RATE_LIMITS.inc()
+
+
+def watch_rate_limits():
+    logger = logging.getLogger("discord.http")
+    logger.addHandler(RateLimitCounter(level=logging.DEBUG))
+    if logger.getEffectiveLevel() > logging.WARNING:
+        logger.setLevel(logging.WARNING)
+
+
+async def start_server(host, port):
+    async def handle_metrics(request):
+        return web.Response(text=registry.render(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle_metrics)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+    return runner
@@ -0,0 +1,105 @@
+import os
+import time
+from collections import OrderedDict, namedtuple
+
+# Staff roles from lowest to highest rank. Each is configured by an env var
+# named after it, e.g. TRIAL_MOD_ROLE=<role id>.
+RANKS = ("trial_mod", "staff", "manager", "ex_chairman", "head_manager", "chairman", "founder")
+NOT_STAFF = -1
+
+# The lowest rank allowed to use each capability; override with e.g. PERMISSION_BAN=manager.
+CAPABILITIES = {
+    "kick": "trial_mod",
+    "ban": "staff",
+    "timeout": "trial_mod",
+    "purge": "trial_mod",
+    "say": "trial_mod",
+}
+
+PermissionConfig = namedtuple("PermissionConfig", "role_ranks staff_roles capabilities_by_rank")
+Decision = namedtuple("Decision", "rank capabilities top_position expires")
+
+
+def load_config(env=None, defaults=None):
+    """Build a PermissionConfig from `env` (os.environ by default).
+
+    `defaults` maps rank names to role IDs used when the env var is missing.
+    """
+    env = os.environ if env is None else env
+    defaults = defaults or {}
+    role_ranks = {}
+    for rank, name in enumerate(RANKS):
+        role_id = env.get(f"{name.upper()}_ROLE") or defaults.get(name)
+        if role_id:
+            role_ranks[int(role_id)] = rank
+
+    min_ranks = {}
+    for capability, default in CAPABILITIES.items():
+        name = env.get(f"PERMISSION_{capability.upper()}", default).lower()
+        if name not in RANKS:
+            raise ValueError(f"PERMISSION_{capability.upper()}: unknown rank {name!r}; expected one of {', '.join(RANKS)}")
+        min_ranks[capability] = RANKS.index(name)
+
+    # One frozenset of capabilities per rank (index 0 is "not staff").
+    capabilities_by_rank = tuple(
+        frozenset(capability for capability, min_rank in min_ranks.items() if rank >= min_rank)
+        for rank in range(NOT_STAFF, len(RANKS))
+    )
+    return PermissionConfig(role_ranks, frozenset(role_ranks), capabilities_by_rank)
+
+
+class PermissionResolver:
+    """Answers "can this member do X?" from a per-member decision cache.
+
+    A decision (staff rank, capabilities, top role position) is computed once
+    from the member's roles and reused until the member's roles change, a
+    role is edited, or `ttl` seconds pass. The bot invalidates entries from
+    on_member_update and the guild role events; the TTL only bounds how stale
+    a decision can get for members whose updates aren't dispatched (e.g. the
+    lean intents profile).
+    """
+
+    def __init__(self, config, cache_size=10_000, ttl=600.0):
+        self.config = config
+        self.cache_size = cache_size
+        self.ttl = ttl
+        self._cache = OrderedDict()
+
+    def reload(self, config):
+        self.config = config
+        self._cache.clear()
+
+    def invalidate(self, member_id):
+        self._cache.pop(member_id, None)
+
+    def clear(self):
+        self._cache.clear()
+
+    def _resolve(self, member):
+        role_ranks = self.config.role_ranks
+        rank = NOT_STAFF
+        top_position = -1
+        for role in getattr(member, "roles", ()):
+            rank = max(rank, role_ranks.get(role.id, NOT_STAFF))
+            top_position = max(top_position, role.position)
+        return Decision(rank, self.config.capabilities_by_rank[rank + 1], top_position, time.monotonic() + self.ttl)
+
+    def decision(self, member):
+        decision = self._cache.get(member.id)
+        if decision is None or decision.expires < time.monotonic():
+            decision = self._cache[member.id] = self._resolve(member)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(member.id)
+        return decision
+
+    def is_staff(self, member):
+        return self.decision(member).rank > NOT_STAFF
+
+    def can(self, member, capability):
+        return capability in self.decision(member).capabilities
+
+    def outranks(self, actor, target):
+        """True if the actor's top role is above the target's."""
+        return self.decision(actor).top_position > self.decision(target).top_position
@@ -0,0 +1,33 @@
+class TrustedPromoter:
+    """Tracks which members hold the Trusted role so on_message only has to
+    compare a count against the threshold.
+
+    `promoted` holds the IDs of members known to have the role, either
+    because we granted it or because we saw it on them once. Role removals
+    are reconciled through `discard`, so a member who loses the role is
+    picked up again on their next message.
+    """
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.promoted = set()
+
+    def needs_check(self, user_id, count):
+        return count >= self.threshold and user_id not in self.promoted
+
+    def claim(self, user_id):
+        """Mark a member as promoted before the role is granted, so concurrent
+        messages from them don't grant it twice. Returns False if already claimed."""
+        if user_id in self.promoted:
+            return False
+        self.promoted.add(user_id)
+        return True
+
+    def discard(self, user_id):
+        self.promoted.discard(user_id)
+
+    def reconcile(self, user_id, has_role):
+        if has_role:
+            self.promoted.add(user_id)
+        else:
+            self.promoted.discard(user_id)
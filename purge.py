@@ -0,0 +1,125 @@
+import asyncio
+import re
+import time
+from datetime import datetime, timedelta, timezone
+
+import discord
+
+# Discord only bulk-deletes messages younger than 14 days, at most 100 at a time.
+BULK_DELETE_MAX_AGE = timedelta(days=14)
+BULK_DELETE_MAX = 100
+SINGLE_DELETE_DELAY = 1.0
+PROGRESS_INTERVAL = 2.0
+
+DURATION_UNITS = {"s": "seconds", "m": "minutes", "h": "hours", "d": "days"}
+
+
+def parse_time_bound(text):
+    """Parse "30m"/"2h"/"7d" (that long ago) or an ISO date/datetime into a UTC datetime."""
+    text = text.strip()
+    unit = DURATION_UNITS.get(text[-1:].lower())
+    if unit and text[:-1].isdigit():
+        return datetime.now(timezone.utc) - timedelta(**{unit: int(text[:-1])})
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        raise ValueError(f"Invalid time '{text}'. Use e.g. 30m, 2h, 7d or 2025-01-31.")
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+class PurgeFilter:
+    def __init__(self, author_id=None, bots_only=False, pattern=None, attachments_only=False,
+                 since=None, until=None):
+        self.author_id = author_id
+        self.bots_only = bots_only
+        self.pattern = re.compile(pattern, re.IGNORECASE) if pattern else None
+        self.attachments_only = attachments_only
+        self.since = since
+        self.until = until
+
+    def matches(self, message):
+        if self.author_id is not None and message.author.id != self.author_id:
+            return False
+        if self.bots_only and not message.author.bot:
+            return False
+        if self.attachments_only and not message.attachments:
+            return False
+        if self.pattern and not self.pattern.search(message.content):
+            return False
+        return True
+
+    def describe(self):
+        parts = []
+        if self.author_id is not None:
+            parts.append(f"from <@{self.author_id}>")
+        if self.bots_only:
+            parts.append("from bots")
+        if self.pattern:
+            parts.append(f"matching `{self.pattern.pattern}`")
+        if self.attachments_only:
+            parts.append("with attachments")
+        if self.since:
+            parts.append(f"since {discord.utils.format_dt(self.since)}")
+        if self.until:
+            parts.append(f"until {discord.utils.format_dt(self.until)}")
+        return " ".join(parts)
+
+
+class PurgeResult:
+    def __init__(self):
+        self.scanned = 0
+        self.deleted = 0
+        self.failed = 0
+
+
+async def run_purge(channel, limit, purge_filter, progress=None, skip_ids=()):
+    """Search up to `limit` of the channel's most recent messages and delete
+    the ones matching `purge_filter`.
+
+    History is streamed page by page; only the current bulk-delete batch is
+    held in memory. Messages younger than 14 days are bulk-deleted in batches
+    of 100, older ones are deleted one at a time with a delay between calls.
+    `progress(result)` is awaited at most every PROGRESS_INTERVAL seconds.
+    """
+    result = PurgeResult()
+    bulk_cutoff = datetime.now(timezone.utc) - BULK_DELETE_MAX_AGE
+    batch = []
+    last_progress = time.monotonic()
+
+    async def flush_batch():
+        if not batch:
+            return
+        try:
+            await channel.delete_messages(batch)
+            result.deleted += len(batch)
+        except discord.HTTPException:
+            result.failed += len(batch)
+        batch.clear()
+
+    async for message in channel.history(limit=limit, before=purge_filter.until,
+                                         after=purge_filter.since, oldest_first=False):
+        result.scanned += 1
+        if message.id in skip_ids or not purge_filter.matches(message):
+            continue
+
+        if message.created_at > bulk_cutoff:
+            batch.append(message)
+            if len(batch) == BULK_DELETE_MAX:
+                await flush_batch()
+        else:
+            await flush_batch()
+            try:
+                await message.delete()
+                result.deleted += 1
+            except discord.NotFound:
+                pass
+            except discord.HTTPException:
+                result.failed += 1
+            await asyncio.sleep(SINGLE_DELETE_DELAY)
+
+        if progress and time.monotonic() - last_progress >= PROGRESS_INTERVAL:
+            last_progress = time.monotonic()
+            await progress(result)
+
+    await flush_batch()
+    return result
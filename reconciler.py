@@ -0,0 +1,90 @@
+import asyncio
+import time
+from collections import Counter
+
+
+class MemberSweep:
+    """Periodically walks every member and fixes the ones whose state drifted.
+
+    `plan(member)` is a cheap, local check that returns what needs fixing (or
+    None); only those members reach `apply(member, fix)`, which makes the
+    REST calls and returns a label for the report. Members are read
+    `chunk_size` at a time with `chunk_delay` seconds between chunks, fixes
+    run at most `concurrency` at a time and start no closer than
+    `fix_interval` seconds apart, so a sweep never bursts. After each pass
+    `on_report(labels, checked, elapsed)` is awaited with a Counter of the
+    labels.
+    """
+
+    def __init__(self, get_members, plan, apply, on_report, interval=6 * 3600, chunk_size=500,
+                 chunk_delay=1.0, concurrency=2, fix_interval=1.0):
+        self.get_members = get_members
+        self.plan = plan
+        self.apply = apply
+        self.on_report = on_report
+        self.interval = interval
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.concurrency = concurrency
+        self.fix_interval = fix_interval
+        self.last_report = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._next_fix = 0.0
+        self._task = None
+
+    async def _fix(self, member, fix, labels):
+        async with self._semaphore:
+            delay = self._next_fix - time.monotonic()
+            self._next_fix = max(self._next_fix, time.monotonic()) + self.fix_interval
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                labels[await self.apply(member, fix)] += 1
+            except Exception as e:
+                labels["failed"] += 1
+                print(f"⚠️ Failed to reconcile {member}: {e}")
+
+    async def sweep(self):
+        started = time.monotonic()
+        labels = Counter()
+        checked = 0
+        pending = set()
+        try:
+            async for member in self.get_members():
+                checked += 1
+                fix = self.plan(member)
+                if fix is not None:
+                    pending.add(asyncio.create_task(self._fix(member, fix, labels)))
+                    # Don't read ahead of the fixes: at most one chunk waits at a time.
+                    if len(pending) >= self.chunk_size:
+                        _, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                if checked % self.chunk_size == 0:
+                    await asyncio.sleep(self.chunk_delay)
+            if pending:
+                await asyncio.wait(pending)
+        finally:
+            for task in pending:
+                task.cancel()
+        self.last_report = (labels, checked, time.monotonic() - started)
+        await self.on_report(*self.last_report)
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.sweep()
+            except Exception as e:
+                print(f"⚠️ Member sweep failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
@@ -0,0 +1,430 @@
+import asyncio
+import json
+import os
+import sqlite3
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+Case = namedtuple("Case", "case_id action target_id actor_id reason duration channel_id details created_at updated_at")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key   TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS message_counts (
+    user_id INTEGER PRIMARY KEY,
+    count   INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_message_counts_rank ON message_counts (count DESC, user_id);
+-- Message activity in hourly buckets, rolled up into daily buckets once old.
+-- kind is 0 for a user and 1 for a channel; hour/day are Unix time // 3600 / 86400.
+CREATE TABLE IF NOT EXISTS activity_hourly (
+    kind  INTEGER NOT NULL,
+    id    INTEGER NOT NULL,
+    hour  INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (kind, id, hour)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_activity_hourly_hour ON activity_hourly (hour);
+CREATE TABLE IF NOT EXISTS activity_daily (
+    kind  INTEGER NOT NULL,
+    id    INTEGER NOT NULL,
+    day   INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (kind, id, day)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_activity_daily_day ON activity_daily (day);
+-- Historical backfill: per-channel checkpoints and the counts gathered so far
+CREATE TABLE IF NOT EXISTS backfill_channels (
+    channel_id INTEGER PRIMARY KEY,
+    before_id  INTEGER,
+    scanned    INTEGER NOT NULL DEFAULT 0,
+    done       INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS backfill_counts (
+    user_id INTEGER PRIMARY KEY,
+    count   INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS trusted_grants (
+    user_id    INTEGER PRIMARY KEY,
+    granted_at TEXT NOT NULL
+);
+-- Moderation cases. target_id is NULL for purges that weren't limited to one
+-- user; duration is in seconds (timeouts); channel_id is set for purges.
+CREATE TABLE IF NOT EXISTS cases (
+    case_id    INTEGER PRIMARY KEY AUTOINCREMENT,
+    action     TEXT NOT NULL,
+    target_id  INTEGER,
+    actor_id   INTEGER NOT NULL,
+    reason     TEXT,
+    duration   INTEGER,
+    channel_id INTEGER,
+    details    TEXT,
+    created_at TEXT NOT NULL,
+    updated_at TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_cases_target ON cases (target_id, case_id DESC);
+"""
+
+
+class Storage:
+    """SQLite database for per-user stats.
+
+    All queries run on a single worker thread that owns the connection, so the
+    event loop never blocks on disk and SQLite never sees concurrent use of
+    the same connection.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="storage")
+        self._conn = None
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    # --- Lifecycle ---
+    def _open(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        conn.commit()
+        self._conn = conn
+
+    async def open(self):
+        await self._run(self._open)
+
+    def _close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def close(self):
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+
+    # --- Meta ---
+    def _get_meta(self, key):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def _set_meta(self, key, value):
+        self._conn.execute(
+            "INSERT INTO meta (key, value) VALUES (?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+        self._conn.commit()
+
+    async def get_meta(self, key):
+        return await self._run(self._get_meta, key)
+
+    async def set_meta(self, key, value):
+        await self._run(self._set_meta, key, value)
+
+    # --- JSON migration ---
+    def _import_json(self, json_path):
+        if self._get_meta("json_imported") or not os.path.exists(json_path):
+            return 0
+        with open(json_path, "r") as f:
+            counts = json.load(f)
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO message_counts (user_id, count) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET count = count + excluded.count",
+                ((int(user_id), int(count)) for user_id, count in counts.items()),
+            )
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES ('json_imported', ?)",
+                (datetime.now(timezone.utc).isoformat(),),
+            )
+        os.replace(json_path, json_path + ".imported")
+        return len(counts)
+
+    async def import_json(self, json_path):
+        """Import a legacy message_counts.json once, then move it aside."""
+        return await self._run(self._import_json, json_path)
+
+    # --- Message counts ---
+    def _get_count(self, user_id):
+        row = self._conn.execute(
+            "SELECT count FROM message_counts WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    async def get_count(self, user_id):
+        return await self._run(self._get_count, int(user_id))
+
+    def _add_counts(self, deltas):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO message_counts (user_id, count) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET count = count + excluded.count",
+                deltas.items(),
+            )
+
+    async def add_counts(self, deltas):
+        """Add a batch of {user_id: delta} in one transaction."""
+        if deltas:
+            await self._run(self._add_counts, deltas)
+
+    # --- Leaderboard ---
+    # Both queries walk idx_message_counts_rank, so top-N costs O(log n + N)
+    # and a rank lookup only scans the entries ranked above the user.
+    def _top_counts(self, limit, offset):
+        return self._conn.execute(
+            "SELECT user_id, count FROM message_counts ORDER BY count DESC, user_id LIMIT ? OFFSET ?",
+            (limit, offset),
+        ).fetchall()
+
+    async def top_counts(self, limit=10, offset=0):
+        return await self._run(self._top_counts, limit, offset)
+
+    def _rank(self, user_id):
+        count = self._get_count(user_id)
+        if not count:
+            return None, 0
+        above = self._conn.execute(
+            "SELECT COUNT(*) FROM message_counts WHERE count > ?", (count,)
+        ).fetchone()[0]
+        return above + 1, count
+
+    async def rank(self, user_id):
+        """Return (rank, count) for a user, or (None, 0) if they have no messages."""
+        return await self._run(self._rank, int(user_id))
+
+    def _ranked_users(self):
+        return self._conn.execute("SELECT COUNT(*) FROM message_counts WHERE count > 0").fetchone()[0]
+
+    async def ranked_users(self):
+        return await self._run(self._ranked_users)
+
+    # --- Activity history ---
+    def _add_activity(self, buckets):
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO activity_hourly (kind, id, hour, count) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(kind, id, hour) DO UPDATE SET count = count + excluded.count",
+                ((kind, key, hour, count) for (kind, key, hour), count in buckets.items()),
+            )
+
+    async def add_activity(self, buckets):
+        """Add a batch of {(kind, id, hour): count} in one transaction."""
+        if buckets:
+            await self._run(self._add_activity, buckets)
+
+    def _compact_activity(self, rollup_before_hour, delete_before_day):
+        with self._conn:
+            self._conn.execute(
+                "INSERT INTO activity_daily (kind, id, day, count) "
+                "SELECT kind, id, hour / 24, SUM(count) FROM activity_hourly WHERE hour < ? "
+                "GROUP BY kind, id, hour / 24 "
+                "ON CONFLICT(kind, id, day) DO UPDATE SET count = count + excluded.count",
+                (rollup_before_hour,),
+            )
+            self._conn.execute("DELETE FROM activity_hourly WHERE hour < ?", (rollup_before_hour,))
+            self._conn.execute("DELETE FROM activity_daily WHERE day < ?", (delete_before_day,))
+
+    async def compact_activity(self, rollup_before_hour, delete_before_day):
+        """Roll hourly buckets older than `rollup_before_hour` into days and drop
+        days older than `delete_before_day`."""
+        await self._run(self._compact_activity, rollup_before_hour, delete_before_day)
+
+    def _activity_totals(self, kind, key, since_hours):
+        # One pass over the hourly and daily rows for this id; each window is a
+        # conditional SUM, so all windows come back from a single range scan.
+        # A daily bucket only counts towards a window if the whole day is inside it.
+        windows = ", ".join(f"SUM(CASE WHEN hour >= {int(h)} THEN count ELSE 0 END)" for h in since_hours)
+        earliest = min(since_hours)
+        row = self._conn.execute(
+            f"SELECT {windows} FROM ("
+            "  SELECT hour, count FROM activity_hourly WHERE kind = ? AND id = ? AND hour >= ?"
+            "  UNION ALL"
+            "  SELECT day * 24 AS hour, count FROM activity_daily WHERE kind = ? AND id = ? AND day >= ?"
+            ")",
+            (kind, key, earliest, kind, key, earliest // 24),
+        ).fetchone()
+        return [value or 0 for value in row]
+
+    async def activity_totals(self, kind, key, since_hours):
+        """Message counts for one user/channel since each hour in `since_hours`."""
+        return await self._run(self._activity_totals, kind, int(key), list(since_hours))
+
+    def _activity_peak_hour(self, kind, key, since_hour):
+        query = "SELECT hour, SUM(count) AS total FROM activity_hourly WHERE hour >= ?"
+        params = [since_hour]
+        if kind is not None:
+            query += " AND kind = ? AND id = ?"
+            params += [kind, key]
+        else:
+            query += " AND kind = 1"
+        return self._conn.execute(query + " GROUP BY hour ORDER BY total DESC LIMIT 1", params).fetchone()
+
+    async def activity_peak_hour(self, since_hour, kind=None, key=None):
+        """Return (hour, count) of the busiest hour since `since_hour`, for one
+        user/channel or (kind=None) the whole server."""
+        return await self._run(self._activity_peak_hour, kind, key, since_hour)
+
+    def _top_activity(self, kind, since_hour, limit):
+        return self._conn.execute(
+            "SELECT id, SUM(count) AS total FROM activity_hourly WHERE kind = ? AND hour >= ? "
+            "GROUP BY id ORDER BY total DESC LIMIT ?",
+            (kind, since_hour, limit),
+        ).fetchall()
+
+    async def top_activity(self, kind, since_hour, limit=5):
+        return await self._run(self._top_activity, kind, since_hour, limit)
+
+    # --- Historical backfill ---
+    def _backfill_checkpoints(self):
+        rows = self._conn.execute("SELECT channel_id, before_id, scanned, done FROM backfill_channels").fetchall()
+        return {channel_id: (before_id, scanned, bool(done)) for channel_id, before_id, scanned, done in rows}
+
+    async def backfill_checkpoints(self):
+        """Return {channel_id: (before_id, scanned, done)} for the current backfill."""
+        return await self._run(self._backfill_checkpoints)
+
+    def _save_backfill_page(self, channel_id, before_id, scanned, counts, done):
+        # Counts and checkpoint are committed together, so a restart resumes
+        # exactly after the last saved page and never counts a page twice.
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO backfill_counts (user_id, count) VALUES (?, ?) "
+                "ON CONFLICT(user_id) DO UPDATE SET count = count + excluded.count",
+                counts.items(),
+            )
+            self._conn.execute(
+                "INSERT INTO backfill_channels (channel_id, before_id, scanned, done) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(channel_id) DO UPDATE SET before_id = excluded.before_id, "
+                "scanned = backfill_channels.scanned + excluded.scanned, done = excluded.done",
+                (channel_id, before_id, scanned, int(done)),
+            )
+
+    async def save_backfill_page(self, channel_id, before_id, scanned, counts, done=False):
+        await self._run(self._save_backfill_page, channel_id, before_id, scanned, counts, done)
+
+    def _merge_backfill(self, state_key, state):
+        with self._conn:
+            merged = dict(self._conn.execute("SELECT user_id, count FROM backfill_counts").fetchall())
+            self._conn.execute(
+                "INSERT INTO message_counts (user_id, count) SELECT user_id, count FROM backfill_counts WHERE true "
+                "ON CONFLICT(user_id) DO UPDATE SET count = count + excluded.count"
+            )
+            self._conn.execute("DELETE FROM backfill_counts")
+            self._conn.execute("DELETE FROM backfill_channels")
+            self._conn.execute(
+                "INSERT INTO meta (key, value) VALUES (?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (state_key, state),
+            )
+        return merged
+
+    async def merge_backfill(self, state_key, state):
+        """Add the backfilled counts to message_counts, clear the backfill
+        tables and set meta[state_key] = state, in one transaction, so a crash
+        can never leave the counts merged but the job unfinished. Returns the
+        merged {user_id: count}."""
+        return await self._run(self._merge_backfill, state_key, state)
+
+    def _reset_backfill(self):
+        with self._conn:
+            self._conn.execute("DELETE FROM backfill_counts")
+            self._conn.execute("DELETE FROM backfill_channels")
+
+    async def reset_backfill(self):
+        await self._run(self._reset_backfill)
+
+    def _counts_at_least(self, threshold, user_ids):
+        rows = []
+        user_ids = list(user_ids)
+        # Stay under SQLite's bound-parameter limit.
+        for start in range(0, len(user_ids), 500):
+            chunk = user_ids[start:start + 500]
+            rows += self._conn.execute(
+                f"SELECT user_id, count FROM message_counts WHERE count >= ? "
+                f"AND user_id IN ({','.join('?' * len(chunk))})",
+                (threshold, *chunk),
+            ).fetchall()
+        return rows
+
+    async def counts_at_least(self, threshold, user_ids):
+        """Return (user_id, count) for the given users whose count is >= threshold."""
+        return await self._run(self._counts_at_least, threshold, user_ids)
+
+    # --- Trusted grants ---
+    def _record_trusted_grant(self, user_id, granted_at):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO trusted_grants (user_id, granted_at) VALUES (?, ?)",
+                (user_id, granted_at),
+            )
+
+    async def record_trusted_grant(self, user_id):
+        await self._run(self._record_trusted_grant, int(user_id),
+                        datetime.now(timezone.utc).isoformat())
+
+    # --- Moderation cases ---
+    def _add_case(self, action, actor_id, target_id, reason, duration, channel_id, details, created_at):
+        with self._conn:
+            cursor = self._conn.execute(
+                "INSERT INTO cases (action, target_id, actor_id, reason, duration, channel_id, details, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (action, target_id, actor_id, reason, duration, channel_id, details, created_at),
+            )
+        return cursor.lastrowid
+
+    async def add_case(self, action, actor_id, target_id=None, reason=None, duration=None,
+                       channel_id=None, details=None):
+        """Record a moderation action and return its case ID."""
+        return await self._run(self._add_case, action, int(actor_id), target_id and int(target_id), reason,
+                               duration, channel_id, details, datetime.now(timezone.utc).isoformat())
+
+    def _add_cases(self, action, actor_id, target_ids, reason, duration, details, created_at):
+        with self._conn:
+            return [
+                self._conn.execute(
+                    "INSERT INTO cases (action, target_id, actor_id, reason, duration, details, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (action, target_id, actor_id, reason, duration, details, created_at),
+                ).lastrowid
+                for target_id in target_ids
+            ]
+
+    async def add_cases(self, action, actor_id, target_ids, reason=None, duration=None, details=None):
+        """Record the same action against many users in one transaction; returns the case IDs."""
+        return await self._run(self._add_cases, action, int(actor_id), [int(i) for i in target_ids], reason,
+                               duration, details, datetime.now(timezone.utc).isoformat())
+
+    def _get_case(self, case_id):
+        row = self._conn.execute("SELECT * FROM cases WHERE case_id = ?", (case_id,)).fetchone()
+        return Case(*row) if row else None
+
+    async def get_case(self, case_id):
+        return await self._run(self._get_case, case_id)
+
+    def _cases_for(self, target_id, limit, offset):
+        total = self._conn.execute("SELECT COUNT(*) FROM cases WHERE target_id = ?", (target_id,)).fetchone()[0]
+        rows = self._conn.execute(
+            "SELECT * FROM cases WHERE target_id = ? ORDER BY case_id DESC LIMIT ? OFFSET ?",
+            (target_id, limit, offset),
+        ).fetchall()
+        return total, [Case(*row) for row in rows]
+
+    async def cases_for(self, target_id, limit=10, offset=0):
+        """Return (total, newest cases) for one user."""
+        return await self._run(self._cases_for, int(target_id), limit, offset)
+
+    def _update_case_reason(self, case_id, reason, updated_at):
+        with self._conn:
+            cursor = self._conn.execute(
+                "UPDATE cases SET reason = ?, updated_at = ? WHERE case_id = ?", (reason, updated_at, case_id)
+            )
+        return cursor.rowcount > 0
+
+    async def update_case_reason(self, case_id, reason):
+        """Returns False if there is no such case."""
+        return await self._run(self._update_case_reason, case_id, reason, datetime.now(timezone.utc).isoformat())